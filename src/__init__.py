@@ -0,0 +1,25 @@
+"""DILI label screening modules.
+
+Importing the package is cheap: the modules below are only imported when
+first accessed (``src.pdfCache``, ``src.votingEngine``, ...), and nothing is
+configured until ``src.init()`` loads the API keys from env.txt / .env
+(the API client also does this on first use).
+"""
+import importlib, os, sys
+
+_SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+if _SRC_DIR not in sys.path:
+    # The modules import each other by bare name (from pdfCache import ...), as when run from src/
+    sys.path.append(_SRC_DIR)
+
+from config import init
+
+__all__ = ["init"]
+
+
+def __getattr__(name):
+    if not os.path.exists(os.path.join(_SRC_DIR, f"{name}.py")):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(name)
+    globals()[name] = module
+    return module
@@ -1,15 +1,19 @@
-import openai
-from swarm import Swarm, Agent
-from swarm.types import Result
-import os, re
-import PyPDF2
-
-with open('../env.txt','r') as env_file:
-    for line in env_file.readlines():
-        key, val = re.split('=', line.strip())
-        os.environ[key]=val
-
-        
+import os, re, time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from drugIndex import get_drug_index
+from hepatoLexicon import format_terms, get_lexicon
+from evidenceStore import get_evidence_store
+from labelChunker import DEFAULT_CHUNK_TOKENS, DEFAULT_OVERLAP_TOKENS, count_tokens, map_chunks, merge_sections
+from llmCache import get_llm_cache
+from pdfCache import get_default_cache
+from sectionSplitter import split_AE_sections
+from tracing import add_event, propagate, span
+
+# Importing this module only loads the PDF, text and cache helpers. Swarm, the OpenAI client, the
+# cascade and the retrieval index are imported by the tools that use them, the API key is
+# loaded with the client (config.init) and the agents are built on first use (build_agents).
+
 prompt_main = f'''
 You are a helpful agent to determine which agent to use for user.
 If the user asked for DILI or liver injury classification of a drug, use Agent DILI.
@@ -19,25 +23,53 @@ Otherwise, use Agent Generic.
 
 prompt_DILI = f'''
 Transfer the query to Agent TOI to retrieve the full text from the PDF.
+For questions across several labels, or to check a specific finding, use retrieve_dili_passages
+to get the most relevant liver injury passages instead of whole labels.
 Answer the user question based on the information extracted from.
 '''
 
+# Defaults for the per-section keyword calls, overridable through context_variables
+MAX_CONCURRENCY = 4    # context_variables['max_concurrency']
+LLM_TIMEOUT = 30       # seconds per call, context_variables['llm_timeout']
+
 
 # Define PDF text extraction function
 def extract_pdf_text(file_path, context_variables):
-    try:
-        with open(file_path, "rb") as pdf_file:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            full_text = ""
-            for page in pdf_reader.pages:
-                full_text += page.extract_text()
-        return full_text
-    except FileNotFoundError:
-        return "Error: PDF file not found."
-    except Exception as e:
-        return f"Error reading PDF file: {e}"
+    with span("tool.extract_pdf_text", **{"pdf.path": file_path}):
+        try:
+            # Pages are cached on disk by content hash, repeat lookups skip PDF parsing
+            return get_default_cache().get_text(file_path)
+        except FileNotFoundError:
+            return "Error: PDF file not found."
+        except Exception as e:
+            return f"Error reading PDF file: {e}"
+
+def extract_AE_text(file_path, context_variables):
+    with span("tool.extract_AE_text", **{"pdf.path": file_path}):
+        try:
+            # Only the Warnings and Adverse Reactions pages, found from the PDF outline or read until complete
+            return get_default_cache().get_AE_text(file_path)
+        except FileNotFoundError:
+            return "Error: PDF file not found."
+        except Exception as e:
+            return f"Error reading PDF file: {e}"
 
 def get_AE_sections(text, context_variables):
+    # Long labels are cut into overlapping token-budgeted windows (context_variables chunk_tokens,
+    # chunk_overlap_tokens) sent in parallel, and the sections found in each are merged
+    with span("tool.get_AE_sections") as s:
+        max_tokens = context_variables.get('chunk_tokens', DEFAULT_CHUNK_TOKENS)
+        tokens = count_tokens(text)
+        s.set(**{"text.tokens": tokens})
+        if tokens <= max_tokens:
+            return get_AE_sections_window(text, context_variables)
+        window_sections = map_chunks(text, propagate(lambda window: get_AE_sections_window(window, context_variables)),
+                                     max_tokens, context_variables.get('chunk_overlap_tokens', DEFAULT_OVERLAP_TOKENS),
+                                     context_variables.get('max_concurrency', MAX_CONCURRENCY))
+        s.set(**{"chunk.windows": len(window_sections)})
+        return merge_sections(window_sections) or "Error extracting sections."
+
+def get_AE_sections_window(text, context_variables):
     res=[]
     prompt = f"""
     You are an expert in drug labeling review.
@@ -49,8 +81,11 @@ def get_AE_sections(text, context_variables):
     #S1 [Warnings and Precautions]:[No DILI information was found.] 
     #S2 [Adverse Reactions]:[...original content from input texts...]
     """
+    from llmClient import get_client
     try:
-        response = openai.chat.completions.create(
+        # Deterministic (temperature=0) calls are served from the response cache when seen before
+        content = get_llm_cache().complete(
+            get_client().chat,
             model="gpt-4o-mini",
             messages=[{"role": "system", "content": prompt},
                       {"role": "user", "content": text}
@@ -58,7 +93,7 @@ def get_AE_sections(text, context_variables):
             max_tokens=2000,
             temperature=0
         )
-        section_content = response.choices[0].message.content.strip()
+        section_content = content.strip()
         if context_variables['verbose']:
             print('\n==DILI related sections in the document===\n',section_content,'\n===End===\n')
         sections = re.split(r'\n+',section_content)
@@ -68,7 +103,7 @@ def get_AE_sections(text, context_variables):
         return "Error extracting sections."
     return res
     
-def find_dili_keywords(name, text, context_variables):
+def find_dili_keywords(name, text, context_variables, seed_terms=None):
     # Define the prompt to instruct the LLM to identify DILI-specific keywords
     prompt = f"""
     You are an expert in drug-induced liver injury (DILI). 
@@ -76,94 +111,228 @@ def find_dili_keywords(name, text, context_variables):
     Provide the keywords as a list, focusing only on terms directly relevant to liver injury.
     if it mentioned "No DILI information was found.", return None
     """
-    try:
-        response = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "system", "content": prompt},
-                      {"role": "user", "content": text}
-                     ],
-            max_tokens=150,
-            temperature=0
-        )
-        # print(text[:10], response)
-        keywords = response.choices[0].message.content.strip()
+    if seed_terms:
+        # Terms the lexicon scan found, so the model confirms them and looks for the rest
+        prompt += f"""
+    A terminology scan already found these terms in the text:
+{seed_terms}
+    Include them and add any other DILI-related terms.
+    """
+    from llmClient import get_client
+    with span("tool.find_dili_keywords", **{"section.name": name}):
+        try:
+            # Deterministic (temperature=0) calls are served from the response cache when seen before
+            content = get_llm_cache().complete(
+                get_client().chat,
+                model="gpt-4o-mini",
+                messages=[{"role": "system", "content": prompt},
+                          {"role": "user", "content": text}
+                         ],
+                max_tokens=150,
+                temperature=0,
+                timeout=context_variables.get('llm_timeout', LLM_TIMEOUT)
+            )
+            keywords = content.strip()
+            if context_variables['verbose']:
+                print(f'\n==DILI information found in {name} section===\n {keywords} \n===End===\n')
+            return keywords
+        except Exception as e:
+            print(f"Error querying OpenAI API: {e}")
+            return "Error extracting keywords."
+
+def find_dili_keywords_concurrently(drug_name, sections, context_variables):
+    """Runs find_dili_keywords for all sections on a bounded thread pool.
+
+    Results are collected in section order. A section whose call has not
+    returned within its share of the time budget gets an error entry instead
+    of holding up the others. Sections without any liver term in the
+    hepatotoxicity lexicon get "None" without a call; the others pass the
+    terms found as a seed for the keyword list.
+    """
+    lexicon = get_lexicon()
+    named_sections, seeds, keyword_pool = [], {}, {}
+    hits = lexicon.scan_corpus({i: section for i, section in enumerate(sections)})
+    for i, section in enumerate(sections):
+        try:
+            name, content = re.split(r'(?<=\]):(?=\[)', section, maxsplit=1)
+        except ValueError:
+            print(drug_name, "this section content is not working normal.", section)
+            continue
+        # Entries are added in section order, the calls fill theirs in below
+        keyword_pool[name] = "None"
+        if hits[i]:
+            named_sections.append((name, content))
+            seeds[name] = format_terms(hits[i])
+    if context_variables['verbose'] and len(named_sections) < len(keyword_pool):
+        skipped = [name for name in keyword_pool if name not in seeds]
+        print(f'\n==No liver terms, keyword extraction skipped===\n {skipped} \n===End===\n')
+    if not named_sections:
+        return keyword_pool
+
+    max_workers = context_variables.get('max_concurrency', MAX_CONCURRENCY)
+    timeout = context_variables.get('llm_timeout', LLM_TIMEOUT)
+    # Calls beyond the first max_workers wait for a free thread, so they get extra rounds of budget
+    rounds = -(-len(named_sections) // max_workers)
+    deadline = time.monotonic() + timeout * rounds
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    futures = [(name, pool.submit(propagate(find_dili_keywords), name, content, context_variables, seeds[name]))
+               for name, content in named_sections]
+    for name, future in futures:
+        try:
+            keyword_pool[name] = future.result(timeout=max(0, deadline - time.monotonic()))
+        except TimeoutError:
+            print(drug_name, f"keyword extraction for {name} timed out after {timeout}s.")
+            keyword_pool[name] = "Error extracting keywords: timed out."
+    pool.shutdown(wait=False, cancel_futures=True)
+    return keyword_pool
+
+def retrieve_dili_passages(query, context_variables, drug_name=""):
+    """Returns the label passages that best match a hepatotoxicity question.
+
+    Searches every label, or only the label of drug_name when one is given.
+    """
+    from retrieval import HEPATOTOXICITY_TERMS, get_retrieval_index
+    with span("tool.retrieve_dili_passages", **{"retrieval.query": query, "drug.name": drug_name}) as s:
+        paths = None
+        if drug_name:
+            file_path = get_drug_index().lookup(drug_name)
+            if file_path is None:
+                return get_drug_index().not_found_message(drug_name)
+            paths = [os.path.relpath(file_path, get_drug_index().corpus_dir)]
+        try:
+            passages = get_retrieval_index().search(f"{query} {HEPATOTOXICITY_TERMS}",
+                                                    k=context_variables.get('retrieval_k', 8), paths=paths)
+        except Exception as e:
+            print(f"Error searching the label passages: {e}")
+            return "Error retrieving passages."
         if context_variables['verbose']:
-            print(f'\n==DILI information found in {name} section===\n {keywords} \n===End===\n')
-        return keywords
-    except Exception as e:
-        print(f"Error querying OpenAI API: {e}")
-        return "Error extracting keywords."
+            print(f'\n==Top {len(passages)} passages for "{query}"===\n',
+                  [(p["path"], p["page"] + 1, round(p["score"], 3)) for p in passages], '\n===End===\n')
+        s.set(**{"retrieval.passages": len(passages)})
+        if not passages:
+            return "No matching passages found."
+        return "\n\n".join(f'[{p["path"]} p.{p["page"] + 1}] {p["text"]}' for p in passages)
 
 # Define Agent transfer functions
 def transfer_to_agent_DILI():
     print('use Agent DILI')
-    return agent_b
+    add_event("agent.handoff", **{"agent.name": "Agent DILI"})
+    return build_agents().dili
 
 def transfer_to_agent_DICT():
     print('use Agent DICT')
-    return agent_c
+    add_event("agent.handoff", **{"agent.name": "Agent DICT"})
+    return build_agents().dict
 
 def transfer_to_agent_Generic():
     print('use Agent Generic')
-    return agent_d
+    add_event("agent.handoff", **{"agent.name": "Agent Generic"})
+    return build_agents().generic
+
+def collect_evidence(drug_name, file_path, context_variables):
+    """The label chain behind Agent TOI, returns (sections, keyword_pool).
+
+    Sections are located by their headings on the adverse event pages (the
+    LLM extracts them when there are none), and the DILI keywords of each
+    are extracted unless the hepatotoxicity lexicon finds no liver term in them.
+    """
+    with span("tool.collect_evidence", **{"pdf.path": file_path}) as s:
+        # Extract the adverse event pages from the PDF and locate the sections by their headings,
+        # only read the full text and ask the LLM when none are found
+        sections = split_AE_sections(extract_AE_text(file_path, context_variables))
+        s.set(**{"sections.source": "headings" if sections else "llm"})
+        if sections:
+            if context_variables['verbose']:
+                print('\n==Sections found by heading===\n', [section[:100] for section in sections], '\n===End===\n')
+        else:
+            print('No section headings found, extracting sections with the LLM.')
+            full_text = extract_pdf_text(file_path, context_variables)
+            sections = get_AE_sections(full_text, context_variables)
+        # Sections without any liver term in the lexicon skip the API calls. Only the lexicon decides
+        # this: the local model reads a truncated label and its "Not Relevant" is not safe to skip on.
+        if isinstance(sections, list):
+            s.set(**{"sections.count": len(sections)})
+            keyword_pool = find_dili_keywords_concurrently(drug_name, sections, context_variables)
+        else:
+            keyword_pool = {}
+        if context_variables['verbose']:
+            print(f'LLM response cache: {get_llm_cache().stats()}')
+        return sections, keyword_pool
 
 def transfer_to_agent_TOI(drug_name, context_variables):
     print('use Agent TOI')
-    # Retrieve file path from pdf_dict based on drug name
-    file_path = context_variables['pdf_dict'].get(drug_name.upper(), None)
-    print(f'PDF Retrieval: This file {file_path} is used since drug name "{drug_name}" was found.')
-    if file_path:
-        # Extract full text from PDF
-        full_text = extract_pdf_text(file_path, context_variables)
-        sections = get_AE_sections(full_text, context_variables)
-        keyword_pool={}
-        for section in sections:
-            print('current section, ', section[:100])
-            try:
-                name, content = re.split(r'(?<=\]):(?=\[)', section)
-                # print(name, content)
-                dili_keywords = find_dili_keywords(name, content, context_variables)
-                keyword_pool[name] = dili_keywords
-            except:
-                print(drug_name, "this section content is not working normal.", section)
-                continue
-        if context_variables['verbose']:
-            print(f'\n====Final Reference Used =====\n{str(keyword_pool)}\n=====END======\nFinal Response:\n')
-        return Result(
-            value=str(keyword_pool),
-            context_variables={"final_reference": str(sections),
-                               "final_keywords": str(keyword_pool)}
+    from swarm.types import Result
+    with span("tool.transfer_to_agent_TOI", **{"drug.name": drug_name}) as s:
+        # Retrieve file path from pdf_dict based on drug name, then from the corpus-wide name index.
+        # Only exact names and aliases resolve, close spellings are offered back as suggestions.
+        file_path = context_variables.get('pdf_dict', {}).get(drug_name.upper(), None)
+        if file_path is None:
+            file_path = get_drug_index().lookup(drug_name)
+        print(f'PDF Retrieval: This file {file_path} is used since drug name "{drug_name}" was found.')
+        s.set(**{"pdf.path": file_path})
+        if file_path:
+            # Labels precomputed by evidenceStore.py (same content hash and models) skip the whole chain
+            evidence = get_evidence_store().lookup(file_path)
+            s.set(**{"evidence.hit": evidence is not None})
+            if evidence is not None:
+                print(f'Evidence store: answered from the evidence precomputed for {file_path} ({evidence.label}).')
+                sections, keyword_pool = evidence.sections, evidence.keywords
+            else:
+                sections, keyword_pool = collect_evidence(drug_name, file_path, context_variables)
+            if context_variables['verbose']:
+                print(f'\n====Final Reference Used =====\n{str(keyword_pool)}\n=====END======\nFinal Response:\n')
+            return Result(
+                value=str(keyword_pool),
+                context_variables={"final_reference": str(sections),
+                                   "final_keywords": str(keyword_pool)}
             
+            )
+            # print(full_text)
+            # return full_text
+        else:
+            return get_drug_index().not_found_message(drug_name)
+
+
+# Define the main agent and sub-agents, on first use
+Agents = namedtuple("Agents", ["main", "dili", "dict", "generic"])
+_agents = None
+
+def build_agents():
+    global _agents
+    if _agents is None:
+        from swarm import Agent
+        agent_main = Agent(
+            model="gpt-4o-mini",
+            name="Agent Main",
+            instructions=prompt_main,
+            functions=[transfer_to_agent_DILI, transfer_to_agent_DICT, transfer_to_agent_Generic],
         )
-        # print(full_text)
-        # return full_text
-    else:
-        return "No relevant PDF found for this drug."
-
-
-# Define the main agent and sub-agents
-agent_main = Agent(
-    model="gpt-4o-mini",
-    name="Agent Main",
-    instructions=prompt_main,
-    functions=[transfer_to_agent_DILI, transfer_to_agent_DICT, transfer_to_agent_Generic],
-)
-
-agent_b = Agent(
-    model="gpt-4o",
-    name="Agent DILI",
-    instructions=prompt_DILI,
-    functions=[transfer_to_agent_TOI]  # Properly named function
-)
-
-agent_c = Agent(
-    model="gpt-4o-mini",
-    name="Agent DICT",
-    instructions="Answer whether the drug mentioned will cause cardiotoxicity.",
-)
-
-agent_d = Agent(
-    model="gpt-4o-mini",
-    name="Agent Generic",
-    instructions="Answer the user's question if it does not fall into any other specific categories.",
-)
\ No newline at end of file
+
+        agent_b = Agent(
+            model="gpt-4o",
+            name="Agent DILI",
+            instructions=prompt_DILI,
+            functions=[transfer_to_agent_TOI, retrieve_dili_passages]  # Properly named function
+        )
+
+        agent_c = Agent(
+            model="gpt-4o-mini",
+            name="Agent DICT",
+            instructions="Answer whether the drug mentioned will cause cardiotoxicity.",
+        )
+
+        agent_d = Agent(
+            model="gpt-4o-mini",
+            name="Agent Generic",
+            instructions="Answer the user's question if it does not fall into any other specific categories.",
+        )
+        _agents = Agents(agent_main, agent_b, agent_c, agent_d)
+    return _agents
+
+_AGENT_NAMES = {"agent_main": "main", "agent_b": "dili", "agent_c": "dict", "agent_d": "generic"}
+
+def __getattr__(name):
+    # agentUtils.agent_main etc. still work, building the agents when first asked for
+    if name in _AGENT_NAMES:
+        return getattr(build_agents(), _AGENT_NAMES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
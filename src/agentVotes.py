@@ -0,0 +1,97 @@
+import ast, json, re
+from typing import Literal
+from pydantic import BaseModel, ValidationError
+
+
+class RelevanceVote(BaseModel):
+    """Vote of a MixtureOfAgents classifier."""
+    classification: Literal["Relevant", "Not Relevant"]
+    rationale: str = ""
+
+
+class DiliVote(BaseModel):
+    """Vote of a regulatory agent in demo_majorityVoting."""
+    classification: Literal["dili", "non_dili"]
+    rationale: str = ""
+
+
+_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+
+def _labels(schema):
+    return schema.model_fields["classification"].annotation.__args__
+
+
+def _label_key(text):
+    return re.sub(r"[\s_\-]+", " ", text.strip().strip(".'\"").lower())
+
+
+def parse_vote(text, schema):
+    """Tolerant parser for answers that did not come back as structured output.
+
+    Accepts JSON or a Python dict anywhere in the text (e.g. inside a code
+    fence), label spelling variants ("non-dili", "not relevant."), and
+    finally a bare label in free text. Returns a schema instance or None.
+    """
+    if not text:
+        return None
+    labels = {_label_key(label): label for label in _labels(schema)}
+    m = _OBJECT_RE.search(text)
+    if m:
+        for loads in (json.loads, ast.literal_eval):
+            try:
+                data = loads(m.group(0))
+            except (ValueError, SyntaxError):
+                continue
+            if isinstance(data, dict):
+                label = labels.get(_label_key(str(data.get("classification", ""))))
+                if label:
+                    return schema(classification=label, rationale=str(data.get("rationale", "")))
+    # A bare label; longest first so "not relevant" is not read as "relevant"
+    key = _label_key(text)
+    for label_key in sorted(labels, key=len, reverse=True):
+        if re.search(rf"(?<![a-z]){re.escape(label_key)}(?![a-z])", key):
+            return schema(classification=labels[label_key], rationale=text.strip())
+    return None
+
+
+def _add_usage(usages):
+    usages = [u for u in usages if u]
+    if not usages:
+        return None
+    from openai.types import CompletionUsage
+    return CompletionUsage(prompt_tokens=sum(u.prompt_tokens for u in usages),
+                           completion_tokens=sum(u.completion_tokens for u in usages),
+                           total_tokens=sum(u.total_tokens for u in usages))
+
+
+def _ask(schema, model, messages, **params):
+    # The OpenAI SDK is only loaded once a vote is requested, parsing and the schemas do not need it
+    import openai
+    from llmClient import get_client
+    try:
+        completion = get_client().parse(model=model, messages=messages, response_format=schema, **params)
+    except (openai.LengthFinishReasonError, openai.ContentFilterFinishReasonError, ValidationError) as e:
+        print(f"Structured output failed ({type(e).__name__})")
+        return None, "", None
+    message = completion.choices[0].message
+    text = message.content or message.refusal or ""
+    return message.parsed or parse_vote(text, schema), text, completion.usage
+
+
+def request_vote(schema, model, messages, **params):
+    """Asks for a vote as schema-constrained structured output.
+
+    Falls back to the tolerant parser, then repairs once by showing the
+    model its answer and asking for the schema again. Returns the vote (or
+    None when even the repair fails) and the summed token usage.
+    """
+    vote, text, usage = _ask(schema, model, messages, **params)
+    if vote is not None:
+        return vote, usage
+    print(f"Unusable vote, asking once more: {text[:100]!r}")
+    repair = messages + ([{"role": "assistant", "content": text}] if text else []) + [
+        {"role": "user", "content": "Your answer could not be read. Reply only with a JSON object matching "
+                                    f"this schema: {json.dumps(schema.model_json_schema())}"}]
+    vote, _, repair_usage = _ask(schema, model, repair, **params)
+    return vote, _add_usage([usage, repair_usage])
@@ -0,0 +1,182 @@
+import argparse, csv, hashlib, json, os, statistics, time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ALL_COMPLETED, FIRST_COMPLETED, wait
+from openpyxl import load_workbook
+from cascade import Cascade
+from demo_openai import MixtureOfAgents
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DEFAULT_INPUT = os.path.join(ROOT_DIR, 'data', 'benchmark_text_v1.xlsx')
+DEFAULT_OUTPUT = os.path.join(ROOT_DIR, 'data', 'benchmark_predictions.csv')
+
+
+def iter_rows(path, text_column, label_column=None, id_column=None):
+    """Streams (row number, id, text, expected label) from the first sheet of a workbook."""
+    workbook = load_workbook(path, read_only=True)
+    rows = workbook.worksheets[0].iter_rows(values_only=True)
+    header = [str(h) if h is not None else "" for h in next(rows)]
+    for i, row in enumerate(rows, 2):
+        record = dict(zip(header, row))
+        text = record.get(text_column)
+        if not text:
+            continue
+        row_id = record.get(id_column) if id_column else None
+        expected = expected_label(record.get(label_column)) if label_column else None
+        yield i, row_id, str(text), expected
+    workbook.close()
+
+
+def expected_label(value):
+    """Maps the benchmark's label file path (data/hc/dili/... or data/hc/non_dili/...) to a decision."""
+    value = str(value or "").lower()
+    if "non_dili" in value:
+        return "Not Relevant"
+    if "dili" in value:
+        return "Relevant"
+    return None
+
+
+def row_key(row_number, text):
+    # The text hash guards against resuming a checkpoint written for a different workbook
+    return f"{row_number}:{hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]}"
+
+
+def load_checkpoint(path):
+    done = {}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # partially written last line of an interrupted run
+                done[record["key"]] = record
+    return done
+
+
+def classify_row(environment, row_number, row_id, text, expected, topic, cascade=None):
+    start = time.perf_counter()
+    triage = cascade.triage(text, topic) if cascade else None
+    if triage:
+        # Decided by a cheap tier, no API calls
+        results, prediction, confidence, tier = [], triage.label, triage.confidence, triage.tier
+    else:
+        results = environment.discuss_all(text, topic)
+        decision = environment.decision(results)
+        prediction, confidence, tier = decision.label or "Not Relevant", decision.confidence, "api"
+        if cascade:
+            cascade.record("api", True, time.perf_counter() - start)
+    return {
+        "key": row_key(row_number, text),
+        "row": row_number,
+        "id": row_id,
+        "expected": expected,
+        "prediction": prediction,
+        "correct": None if expected is None else prediction == expected,
+        "confidence": confidence,
+        "tier": tier,
+        "latency": time.perf_counter() - start,
+        "calls": len(results),
+        "prompt_tokens": sum(r["usage"].prompt_tokens for r in results if r["usage"]),
+        "completion_tokens": sum(r["usage"].completion_tokens for r in results if r["usage"]),
+        "votes": {r["agent_name"]: environment.answer(r) for r in results},
+    }
+
+
+def summarize(records, wall_clock):
+    latencies = sorted(r["latency"] for r in records)
+    labelled = [r for r in records if r["correct"] is not None]
+    return {
+        "rows": len(records),
+        "accuracy": sum(r["correct"] for r in labelled) / len(labelled) if labelled else None,
+        "latency_mean": statistics.mean(latencies) if latencies else None,
+        "latency_p50": latencies[len(latencies) // 2] if latencies else None,
+        "latency_p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+        "calls": sum(r["calls"] for r in records),
+        "tiers": dict(Counter(r.get("tier", "api") for r in records)),
+        "prompt_tokens": sum(r["prompt_tokens"] for r in records),
+        "completion_tokens": sum(r["completion_tokens"] for r in records),
+        "wall_clock": wall_clock,
+    }
+
+
+def run_batch(input_path=DEFAULT_INPUT, output_path=DEFAULT_OUTPUT, text_column="Result",
+              label_column="File", id_column="Drug", topic="DILI", workers=4, checkpoint_path=None,
+              cascade=False):
+    """Classifies every row of the workbook with MixtureOfAgents.
+
+    Rows are streamed and at most `workers` are in flight at a time. Each
+    finished row is appended to a JSONL checkpoint, so an interrupted run
+    picks up where it stopped. Writes the predictions as CSV and the
+    accuracy/latency/token statistics next to it as JSON. With cascade=True
+    rows go through the local model tier first and only
+    uncertain ones reach the API agents.
+    """
+    checkpoint_path = checkpoint_path or os.path.splitext(output_path)[0] + '.checkpoint.jsonl'
+    done = load_checkpoint(checkpoint_path)
+    if done:
+        print(f"Resuming: {len(done)} rows already classified in {checkpoint_path}")
+    environment = MixtureOfAgents()
+    router = Cascade(environment) if cascade else None
+    start = time.perf_counter()
+    new_records = []
+    with open(checkpoint_path, 'a') as checkpoint, ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+
+        def drain(return_when):
+            finished, pending = wait(in_flight, return_when=return_when)
+            for future in finished:
+                record = future.result()
+                checkpoint.write(json.dumps(record) + "\n")
+                checkpoint.flush()
+                done[record["key"]] = record
+                new_records.append(record)
+                print(f"row {record['row']} ({record['id']}): {record['prediction']} "
+                      f"[expected {record['expected']}] {record['latency']:.1f}s")
+            return pending
+
+        for row_number, row_id, text, expected in iter_rows(input_path, text_column, label_column, id_column):
+            if row_key(row_number, text) in done:
+                continue
+            if len(in_flight) >= workers:
+                in_flight = drain(FIRST_COMPLETED)
+            in_flight.add(pool.submit(classify_row, environment, row_number, row_id, text, expected, topic,
+                                     router))
+        if in_flight:
+            drain(ALL_COMPLETED)
+
+    records = sorted(done.values(), key=lambda r: r["row"])
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=["row", "id", "expected", "prediction", "correct", "tier", "latency",
+                                               "calls", "prompt_tokens", "completion_tokens", "votes"],
+                                extrasaction='ignore')
+        writer.writeheader()
+        for record in records:
+            writer.writerow(dict(record, votes=json.dumps(record["votes"])))
+
+    # Throughput is measured on the rows classified in this run only
+    stats = summarize(records, time.perf_counter() - start)
+    stats["rows_per_second"] = len(new_records) / stats["wall_clock"] if new_records else None
+    if router:
+        stats["cascade"] = router.stats()
+    stats_path = os.path.splitext(output_path)[0] + '.stats.json'
+    with open(stats_path, 'w') as f:
+        json.dump(stats, f, indent=2)
+    print(json.dumps(stats, indent=2))
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Batch classification of a benchmark workbook with MixtureOfAgents.")
+    parser.add_argument("--input", default=DEFAULT_INPUT, help="xlsx workbook, first sheet is used")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="predictions CSV, stats are written next to it")
+    parser.add_argument("--text-column", default="Result", help="column holding the text to classify")
+    parser.add_argument("--label-column", default="File", help="column holding the dili/non_dili file path")
+    parser.add_argument("--id-column", default="Drug")
+    parser.add_argument("--topic", default="DILI")
+    parser.add_argument("--workers", type=int, default=4, help="rows classified concurrently")
+    parser.add_argument("--checkpoint", default=None, help="JSONL checkpoint (default: next to the output)")
+    parser.add_argument("--cascade", action="store_true", help="triage with the local model first")
+    args = parser.parse_args()
+    run_batch(args.input, args.output, args.text_column, args.label_column, args.id_column,
+              args.topic, args.workers, args.checkpoint, args.cascade)
@@ -0,0 +1,189 @@
+import argparse, json, os, statistics, subprocess, sys, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+from mockLLM import MockLLMServer
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.join(SRC_DIR, '..')
+DEFAULT_OUTPUT = os.path.join(ROOT_DIR, 'data', 'benchmark_perf.json')
+SCENARIOS = ["imports", "pdf", "toi", "discussion", "voting", "cascade"]
+# Entry points of the short-lived workers, and the dependencies that dominate their startup
+IMPORT_MODULES = ["pdfCache", "votingEngine", "demo_openai", "cascade", "jobQueue", "agentUtils", "batchClassify",
+                  "llmClient", "retrieval"]
+HEAVY_MODULES = ["openai", "httpx", "pydantic", "numpy", "pyarrow", "openpyxl", "swarm", "swarms", "tiktoken"]
+_IMPORT_CODE = ("import json, sys, time\n"
+                "start = time.perf_counter()\n"
+                "import {module}\n"
+                "print(json.dumps({{'seconds': time.perf_counter() - start, 'modules': len(sys.modules), "
+                "'heavy': [m for m in {heavy!r} if m in sys.modules]}}))")
+
+
+def percentile(values, q):
+    """Linear interpolation percentile, q in [0, 100]."""
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def summarize(latencies, wall_clock, calls, errors=0):
+    return {
+        "queries": len(latencies),
+        "errors": errors,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_mean": statistics.mean(latencies) if latencies else None,
+        "throughput": len(latencies) / wall_clock if wall_clock else None,
+        "calls_per_query": calls / len(latencies) if latencies else None,
+        "wall_clock": wall_clock,
+    }
+
+
+def measure(server, fn, inputs, concurrency):
+    """Runs fn over inputs on `concurrency` threads, returns the latency/throughput/calls summary."""
+    latencies, errors = [], 0
+
+    def timed(item):
+        start = time.perf_counter()
+        fn(item)
+        return time.perf_counter() - start
+
+    calls_before = server.total_calls()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(timed, item) for item in inputs]:
+            try:
+                latencies.append(future.result())
+            except Exception as e:
+                print(f"Query failed: {e}")
+                errors += 1
+    return summarize(latencies, time.perf_counter() - start, server.total_calls() - calls_before, errors)
+
+
+def bench_imports(modules=IMPORT_MODULES, repeats=5):
+    """Import time of each module in a fresh interpreter (median of repeats) and the heavy packages it loads."""
+    report = {}
+    for module in modules:
+        runs = []
+        for _ in range(repeats):
+            process = subprocess.run([sys.executable, "-c", _IMPORT_CODE.format(module=module, heavy=HEAVY_MODULES)],
+                                     cwd=SRC_DIR, capture_output=True, text=True)
+            if process.returncode != 0:
+                runs = None
+                report[module] = {"error": (process.stderr.strip().splitlines() or ["failed"])[-1]}
+                break
+            runs.append(json.loads(process.stdout.strip().splitlines()[-1]))
+        if runs:
+            report[module] = dict(runs[-1], seconds=statistics.median(run["seconds"] for run in runs))
+    return report
+
+
+def bench_pdf(corpus_sizes):
+    """PDF text extraction per corpus size, cold (empty cache) and warm."""
+    from ingest import DEFAULT_CORPUS_DIR, find_pdfs
+    from pdfCache import PdfTextCache
+    paths = [os.path.join(DEFAULT_CORPUS_DIR, p) for p in find_pdfs(DEFAULT_CORPUS_DIR)]
+    report = {}
+    for size in corpus_sizes:
+        sample = paths[:size]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = PdfTextCache(cache_dir)
+            timings = {}
+            for phase in ("cold", "warm"):
+                latencies, pages = [], 0
+                start = time.perf_counter()
+                for path in sample:
+                    file_start = time.perf_counter()
+                    pages += len(cache.get_pages(path))
+                    latencies.append(time.perf_counter() - file_start)
+                wall_clock = time.perf_counter() - start
+                timings[phase] = dict(summarize(latencies, wall_clock, 0), pages=pages,
+                                      seconds_per_page=wall_clock / pages if pages else None)
+                timings[phase].pop("calls_per_query")
+        report[str(len(sample))] = timings
+    return report
+
+
+def workbook_texts(limit):
+    from batchClassify import DEFAULT_INPUT, iter_rows
+    texts = [text for _, _, text, _ in iter_rows(DEFAULT_INPUT, "Result")]
+    return (texts * (limit // len(texts) + 1))[:limit]
+
+
+def run(scenarios, queries=20, concurrency=4, corpus_sizes=(5, 10, 25), latency=0.2, tokens_per_second=200.0,
+        error_rate=0.0, cache=False):
+    """Runs the scenarios against a mock LLM server, returns {scenario: report}."""
+    report = {"config": {"queries": queries, "concurrency": concurrency, "latency": latency,
+                         "tokens_per_second": tokens_per_second, "error_rate": error_rate, "cache": cache}}
+    if "imports" in scenarios:
+        report["imports"] = bench_imports()
+    if "toi" in scenarios:
+        try:
+            import agentUtils
+            import swarm  # the TOI tool returns a swarm Result
+        except Exception as e:
+            print(f"Skipping toi: {e}")
+            report["toi"] = {"skipped": str(e)}
+            scenarios = [s for s in scenarios if s != "toi"]
+
+    with MockLLMServer(latency=latency, tokens_per_second=tokens_per_second, error_rate=error_rate) as server:
+        os.environ["OPENAI_BASE_URL"] = server.url + "/v1"
+        os.environ["OPENAI_API_KEY"] = "mock"
+        os.environ["OLLAMA_HOST"] = server.url
+        if not cache:
+            os.environ["LLM_CACHE_BACKEND"] = "off"
+        print(f"Mock LLM server on {server.url}")
+
+        if "pdf" in scenarios:
+            report["pdf"] = bench_pdf(corpus_sizes)
+        if "toi" in scenarios:
+            from drugIndex import get_drug_index
+            index = get_drug_index()
+            # One name per label
+            names = list({paths[0]: name for name, paths in sorted(index.names.items())}.values())
+            names = (names * (queries // len(names) + 1))[:queries]
+            context_variables = {"verbose": False}
+            report["toi"] = measure(server, lambda name: agentUtils.transfer_to_agent_TOI(name, context_variables),
+                                    names, concurrency)
+        if {"discussion", "voting", "cascade"} & set(scenarios):
+            from demo_openai import MixtureOfAgents
+            texts = workbook_texts(queries)
+        if "discussion" in scenarios:
+            environment = MixtureOfAgents()
+            report["discussion"] = measure(server, lambda text: environment.conduct_discussion(text, "DILI"),
+                                           texts, concurrency)
+        if "voting" in scenarios:
+            # Calls the voting engine saves by only asking agents that can still change the outcome
+            for eager in (True, False):
+                environment = MixtureOfAgents(eager=eager)
+                report[f"voting_{'eager' if eager else 'lazy'}"] = measure(
+                    server, lambda text: environment.decide(environment.discuss_all(text, "DILI")), texts,
+                    concurrency)
+        if "cascade" in scenarios:
+            from cascade import Cascade
+            router = Cascade(MixtureOfAgents())
+            report["cascade"] = dict(measure(server, lambda text: router.classify(text, "DILI"), texts, concurrency),
+                                     tiers=router.stats())
+        report["calls"] = dict(server.calls)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the agent pipeline against a mock LLM server.")
+    parser.add_argument("--scenarios", nargs="+", default=SCENARIOS, choices=SCENARIOS)
+    parser.add_argument("--queries", type=int, default=20, help="queries per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--corpus-sizes", type=int, nargs="+", default=[5, 10, 25])
+    parser.add_argument("--latency", type=float, default=0.2, help="mock seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of mock requests answered with 429")
+    parser.add_argument("--cache", action="store_true", help="keep the LLM response cache on")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+    report = run(args.scenarios, args.queries, args.concurrency, args.corpus_sizes, args.latency,
+                 args.tokens_per_second, args.error_rate, args.cache)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
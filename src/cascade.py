@@ -0,0 +1,154 @@
+import argparse, threading, time
+from collections import namedtuple
+from agentVotes import RelevanceVote, parse_vote
+from hepatoLexicon import get_lexicon
+from tracing import span
+
+TierDecision = namedtuple("TierDecision", ["label", "confidence", "tier", "latency"])
+
+LOCAL_PROMPT = ("You triage texts for {topic} (drug-induced liver injury). Classify the text as 'Relevant' or "
+                "'Not Relevant' and say how sure you are. Reply only with JSON: "
+                '{{"classification": "...", "confidence": 0.0-1.0, "rationale": "..."}}')
+
+
+# Context window the local model is run with; longer texts are left to the API tier
+# rather than silently truncated by Ollama
+LOCAL_CONTEXT_TOKENS = 8192
+LOCAL_RESERVED_TOKENS = 1024  # prompt, answer, and slack for llama's tokenizer counting differently
+
+
+class TriageVote(RelevanceVote):
+    confidence: float = 0.0
+
+
+def lexicon_tier(text, topic):
+    """Keyword rule for label adverse event text: no liver term at all is Not Relevant.
+
+    Any liver term passes the text on, since severe terms also appear in
+    warnings about other drugs or populations. A rule has no calibrated
+    confidence, so its decisions carry None. Only meaningful on adverse
+    event text: an agent reply without keywords says nothing about the drug.
+    """
+    if not get_lexicon().scan(text):
+        return "Not Relevant", None
+    return None, 0.0
+
+
+def format_confidence(confidence):
+    """'confidence 0.93', or 'keyword rule' for a decision without a confidence score."""
+    return "keyword rule" if confidence is None else f"confidence {confidence:.2f}"
+
+
+def local_tier(text, topic, model="llama3.2", min_confidence=0.8):
+    """Asks the local Ollama model, accepts its answer only when it is confident.
+
+    Texts that do not fit its context window are left undecided.
+    """
+    from labelChunker import count_tokens
+    from llmClient import get_client
+    if count_tokens(text) > LOCAL_CONTEXT_TOKENS - LOCAL_RESERVED_TOKENS:
+        return None, 0.0
+    response = get_client().ollama_chat(
+        model=model,
+        messages=[{"role": "system", "content": LOCAL_PROMPT.format(topic=topic)},
+                  {"role": "user", "content": text}],
+        format="json",
+        options={"temperature": 0, "num_ctx": LOCAL_CONTEXT_TOKENS},
+    )
+    vote = parse_vote(response["message"]["content"], TriageVote)
+    if vote is None or vote.confidence < min_confidence:
+        return None, 0.0
+    return vote.classification, vote.confidence
+
+
+class Cascade:
+    """Routes each text through cheap tiers first and escalates only uncertain ones.
+
+    Tiers are (name, fn) pairs where fn(text, topic) returns (label, confidence)
+    or (None, 0.0) to pass the text on. The last tier is the API
+    MixtureOfAgents, which always decides. A tier that fails (e.g. Ollama not
+    running) passes the text on. The ae_text_tiers only run on label adverse
+    event text (ae_text=True). Per-tier hit rates are kept in stats().
+    """
+
+    def __init__(self, mixture=None, tiers=None, ae_text_tiers=("lexicon",)):
+        self.mixture = mixture
+        self.tiers = list(tiers if tiers is not None else [("lexicon", lexicon_tier), ("local", local_tier)])
+        self.ae_text_tiers = set(ae_text_tiers)
+        self.counts = {name: {"seen": 0, "decided": 0, "errors": 0, "seconds": 0.0}
+                       for name, _ in self.tiers + [("api", None)]}
+        self._lock = threading.Lock()
+
+    def record(self, tier, decided, seconds, error=False):
+        with self._lock:
+            counts = self.counts[tier]
+            counts["seen"] += 1
+            counts["decided"] += decided
+            counts["errors"] += error
+            counts["seconds"] += seconds
+
+    def triage(self, text, topic="DILI", ae_text=False):
+        """Runs the cheap tiers, returns their TierDecision or None when the text needs the API."""
+        for name, tier in self.tiers:
+            if name in self.ae_text_tiers and not ae_text:
+                continue
+            start = time.perf_counter()
+            try:
+                with span("cascade.tier", **{"cascade.tier": name}) as s:
+                    label, confidence = tier(text, topic)
+                    s.set(**{"cascade.label": label, "cascade.confidence": confidence})
+            except Exception as e:
+                print(f"Tier {name} failed, escalating: {e}")
+                self.record(name, False, time.perf_counter() - start, error=True)
+                continue
+            seconds = time.perf_counter() - start
+            self.record(name, label is not None, seconds)
+            if label is not None:
+                return TierDecision(label, confidence, name, seconds)
+        return None
+
+    def escalate(self, text, topic="DILI"):
+        """Classifies with the API MixtureOfAgents, returns the TierDecision and the agent results."""
+        if self.mixture is None:
+            from demo_openai import MixtureOfAgents
+            # The cascade is the cost-saving path: agents are only asked while their vote can still matter
+            self.mixture = MixtureOfAgents(eager=False)
+        start = time.perf_counter()
+        results = self.mixture.discuss_all(text, topic)
+        decision = self.mixture.decision(results)
+        seconds = time.perf_counter() - start
+        self.record("api", True, seconds)
+        return TierDecision(decision.label or "Not Relevant", decision.confidence, "api", seconds), results
+
+    def classify(self, text, topic="DILI", ae_text=False):
+        return self.triage(text, topic, ae_text) or self.escalate(text, topic)[0]
+
+    def stats(self):
+        """Per tier: texts seen, decided, hit rate (decided / seen), errors and mean latency."""
+        with self._lock:
+            return {name: dict(counts,
+                               hit_rate=counts["decided"] / counts["seen"] if counts["seen"] else None,
+                               mean_seconds=counts["seconds"] / counts["seen"] if counts["seen"] else None)
+                    for name, counts in self.counts.items()}
+
+
+_default_cascade = None
+
+def get_cascade():
+    """Returns the process-wide Cascade, so hit rates add up across calls."""
+    global _default_cascade
+    if _default_cascade is None:
+        _default_cascade = Cascade()
+    return _default_cascade
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Classify texts through the model cascade.")
+    parser.add_argument("texts", nargs="+")
+    parser.add_argument("--topic", default="DILI")
+    parser.add_argument("--ae-text", action="store_true", help="the texts are label adverse event sections")
+    args = parser.parse_args()
+    cascade = Cascade()
+    for text in args.texts:
+        print(cascade.classify(text, args.topic, args.ae_text), text[:80])
+    print(cascade.stats())
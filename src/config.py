@@ -0,0 +1,47 @@
+import os, threading
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+# env.txt is what the scripts in src/ used to read, .env what the Streamlit app used to read
+DEFAULT_ENV_FILES = [os.path.join(ROOT_DIR, 'env.txt'), os.path.join(ROOT_DIR, '.env')]
+
+_loaded = None
+_lock = threading.Lock()
+
+
+def read_env_file(path):
+    """KEY=value lines of an env file; blank lines and # comments are skipped, quotes around values removed."""
+    values = {}
+    with open(path, 'r') as env_file:
+        for line in env_file:
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+            key, val = line.split('=', 1)
+            values[key.strip()] = val.strip().strip('"\'')
+    return values
+
+
+def init(env_path=None, override=False):
+    """Loads the API keys and settings into os.environ, once per process.
+
+    Reads env_path, else ENV_FILE, else the first of env.txt and .env in
+    the repository root that exists. Variables already set in the
+    environment win unless override=True, so a shell or a benchmark can
+    point the pipeline elsewhere. Returns the path loaded, or None.
+    Nothing is read at import time: entry points call this, and
+    llmClient.get_client calls it before creating the API client.
+    """
+    global _loaded
+    with _lock:
+        if _loaded is not None and env_path is None:
+            return _loaded or None
+        explicit = env_path or os.environ.get('ENV_FILE')
+        _loaded = ''
+        for path in [explicit] if explicit else DEFAULT_ENV_FILES:
+            if os.path.exists(path):
+                for key, val in read_env_file(path).items():
+                    if override or key not in os.environ:
+                        os.environ[key] = val
+                _loaded = path
+                break
+        return _loaded or None
@@ -1,77 +1,8 @@
-from swarms import MixtureOfAgents, Agent
-from swarm_models import OpenAIChat
 import os
+import config
 
 MAX_LOOPS = 2
 
-# Initialize OpenAI model
-model = OpenAIChat(
-    openai_api_key=os.getenv("OPENAI_API_KEY"), model_name="gpt-4o-mini", temperature=0.1
-)
-
-# Define the director agent
-director = Agent(
-    agent_name="Director",
-    system_prompt="Oversees and directs the tasks for regulatory roles.",
-    llm=model,
-    max_loops=MAX_LOOPS,
-    verbose=True,
-    dashboard=True,
-    streaming_on=True,
-    stopping_token="<DONE>",
-    state_save_file_type="json",
-    saved_state_path="director.json",
-)
-
-# Initialize Regulatory Affairs Specialist agent
-regulatory_affairs_specialist = Agent(
-    agent_name="RegulatoryAffairsSpecialist",
-    system_prompt="Handles regulatory submissions, ensures compliance, and manages documentation.",
-    llm=model,
-    max_loops=MAX_LOOPS,
-    verbose=True,
-    dashboard=True,
-    streaming_on=True,
-    stopping_token="<DONE>",
-    state_save_file_type="json",
-    saved_state_path="regulatory_affairs_specialist.json",
-)
-
-# Initialize Clinical Evaluator/Scientist agent
-clinical_evaluator = Agent(
-    agent_name="ClinicalEvaluator",
-    system_prompt="Assesses safety, efficacy, and quality of products by reviewing clinical trial data.",
-    llm=model,
-    max_loops=MAX_LOOPS,
-    verbose=True,
-    dashboard=True,
-    streaming_on=True,
-    stopping_token="<DONE>",
-    state_save_file_type="json",
-    saved_state_path="clinical_evaluator.json",
-)
-
-# Initialize Quality Assurance Officer agent
-qa_officer = Agent(
-    agent_name="QAOfficer",
-    system_prompt="Oversees quality standards, conducts audits, and ensures compliance with regulatory standards.",
-    llm=model,
-    max_loops=MAX_LOOPS,
-    verbose=True,
-    dashboard=True,
-    streaming_on=True,
-    stopping_token="<DONE>",
-    state_save_file_type="json",
-    saved_state_path="qa_officer.json",
-)
-
-# Initialize the MixtureOfAgents
-moe_swarm = MixtureOfAgents(
-    reference_agents=[director, regulatory_affairs_specialist, clinical_evaluator, qa_officer],
-    aggregator_agent=director,
-    aggregator_system_prompt="Based on the inputs, decides, if this is DILI related or not."
-)
-
 # Define the task and input for the swarm
 task_name = "DILI classification"
 task_description = (
@@ -84,13 +15,100 @@ input_data = (
 )
 
 # Create the formatted template with detailed context for the task
-formatted_task = (
-    f"Task: {task_name}\n"
-    f"Description: {task_description}\n"
-    f"Input data: {input_data}\n\n"
-    "Perform the task in a regulatory science context, and provide insights based on the input provided."
-)
+def format_task(input_data):
+    return (
+        f"Task: {task_name}\n"
+        f"Description: {task_description}\n"
+        f"Input data: {input_data}\n\n"
+        "Perform the task in a regulatory science context, and provide insights based on the input provided."
+    )
+
+formatted_task = format_task(input_data)
+
+
+def build_swarm():
+    """The regulatory MixtureOfAgents. swarms is only imported here, it is slow to load."""
+    from swarms import MixtureOfAgents, Agent
+    from swarm_models import OpenAIChat
+
+    # Initialize OpenAI model
+    model = OpenAIChat(
+        openai_api_key=os.getenv("OPENAI_API_KEY"), model_name="gpt-4o-mini", temperature=0.1
+    )
+
+    # Define the director agent
+    director = Agent(
+        agent_name="Director",
+        system_prompt="Oversees and directs the tasks for regulatory roles.",
+        llm=model,
+        max_loops=MAX_LOOPS,
+        verbose=True,
+        dashboard=True,
+        streaming_on=True,
+        stopping_token="<DONE>",
+        state_save_file_type="json",
+        saved_state_path="director.json",
+    )
+
+    # Initialize Regulatory Affairs Specialist agent
+    regulatory_affairs_specialist = Agent(
+        agent_name="RegulatoryAffairsSpecialist",
+        system_prompt="Handles regulatory submissions, ensures compliance, and manages documentation.",
+        llm=model,
+        max_loops=MAX_LOOPS,
+        verbose=True,
+        dashboard=True,
+        streaming_on=True,
+        stopping_token="<DONE>",
+        state_save_file_type="json",
+        saved_state_path="regulatory_affairs_specialist.json",
+    )
+
+    # Initialize Clinical Evaluator/Scientist agent
+    clinical_evaluator = Agent(
+        agent_name="ClinicalEvaluator",
+        system_prompt="Assesses safety, efficacy, and quality of products by reviewing clinical trial data.",
+        llm=model,
+        max_loops=MAX_LOOPS,
+        verbose=True,
+        dashboard=True,
+        streaming_on=True,
+        stopping_token="<DONE>",
+        state_save_file_type="json",
+        saved_state_path="clinical_evaluator.json",
+    )
+
+    # Initialize Quality Assurance Officer agent
+    qa_officer = Agent(
+        agent_name="QAOfficer",
+        system_prompt="Oversees quality standards, conducts audits, and ensures compliance with regulatory standards.",
+        llm=model,
+        max_loops=MAX_LOOPS,
+        verbose=True,
+        dashboard=True,
+        streaming_on=True,
+        stopping_token="<DONE>",
+        state_save_file_type="json",
+        saved_state_path="qa_officer.json",
+    )
+
+    # Initialize the MixtureOfAgents
+    moe_swarm = MixtureOfAgents(
+        reference_agents=[director, regulatory_affairs_specialist, clinical_evaluator, qa_officer],
+        aggregator_agent=director,
+        aggregator_system_prompt="Based on the inputs, decides, if this is DILI related or not."
+    )
+    return moe_swarm
+
+
+def main():
+    config.init()
+    moe_swarm = build_swarm()
+
+    # Run the swarm with the formatted task
+    history = moe_swarm.run(task=formatted_task)
+    print(history)
+
 
-# Run the swarm with the formatted task
-history = moe_swarm.run(task=formatted_task)
-print(history)
+if __name__ == '__main__':
+    main()
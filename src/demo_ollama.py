@@ -1,4 +1,6 @@
-import ollama
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from llmClient import get_client
 
 
 class Agent:
@@ -23,7 +25,7 @@ class Agent:
         ]
 
         # Call Ollama chat
-        response = ollama.chat(
+        response = get_client().ollama_chat(
             model="llama3.2",
             messages=messages,
         )
@@ -39,7 +41,7 @@ class Agent:
 class MixtureOfAgents:
     """Environment where agents discuss input relevance to a topic."""
 
-    def __init__(self):
+    def __init__(self, max_workers=None):
         # Initialize agents with different expertise
         self.agents = [
             Agent(
@@ -55,14 +57,50 @@ class MixtureOfAgents:
                 expertise="Specializes in identifying mixed liver injury patterns that show both hepatocellular and cholestatic characteristics. This classifier assesses cases where both ALT and ALP levels are elevated, indicating a combination of liver cell damage and bile flow obstruction. It provides a balanced evaluation of drug-induced liver injury risks."
             ),
         ]
+        # Bounded pool the agents are consulted on, all of them at once by default
+        # (Ollama serves them in parallel up to its OLLAMA_NUM_PARALLEL setting)
+        self.max_workers = max_workers or len(self.agents)
+
+    def timed_discuss(self, agent, input_text, topic):
+        start = time.perf_counter()
+        relevance = agent.discuss(input_text, topic)
+        return agent.name, relevance, time.perf_counter() - start
 
     def conduct_discussion(self, input_text, topic):
+        """Asks all agents concurrently and stops waiting once the majority is settled.
+
+        An agent whose call fails counts as an abstention (None in the results).
+        """
         print(f"Discussion on topic: '{topic}' for input: '{input_text}'\n")
         results = []
-        for agent in self.agents:
-            relevance = agent.discuss(input_text, topic)
-            results.append(relevance)
-        self.majority_vote(results)
+        latency = {}
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = {pool.submit(self.timed_discuss, agent, input_text, topic): agent for agent in self.agents}
+            for future in as_completed(futures):
+                try:
+                    name, relevance, seconds = future.result()
+                except Exception as e:
+                    print(f"{futures[future].name} failed, counted as abstention: {e}")
+                    results.append(None)
+                else:
+                    results.append(relevance)
+                    latency[name] = round(seconds, 2)
+                if self.is_decided(results):
+                    break
+        finally:
+            # Calls still queued are dropped, calls in flight finish in the background
+            pool.shutdown(wait=False, cancel_futures=True)
+        print(f"Latency (s): {latency}")
+        return self.majority_vote(results), latency
+
+    def is_decided(self, results):
+        """True once the remaining agents can no longer change the majority decision."""
+        relevant_count = results.count("Relevant")
+        not_relevant_count = results.count("Not Relevant")
+        remaining = len(self.agents) - len(results)
+        # Ties go to "Not Relevant", see majority_vote
+        return relevant_count > not_relevant_count + remaining or relevant_count + remaining <= not_relevant_count
 
     def majority_vote(self, results):
         """Determines the majority relevance based on agent responses."""
@@ -75,11 +113,14 @@ class MixtureOfAgents:
             final_decision = "Not Relevant"
 
         print(f"\nMajority decision: The input is {final_decision} to the topic.\n")
+        return final_decision
+
 
+if __name__ == '__main__':
 
-# Instantiate the environment and conduct a discussion
-environment = MixtureOfAgents()
-input_text = """
-The high-throughput and liver-on-chip systems exhibit enhanced in vivo-like functions and demonstrate the potential utility of these platforms for DILI risk assessment. Tenofovir-inarigivr-associated hepatotoxicity was observed and correlates with the clinical manifestation of DILI observed in patients."""
-topic = "DILI"
-environment.conduct_discussion(input_text, topic)
+    # Instantiate the environment and conduct a discussion
+    environment = MixtureOfAgents()
+    input_text = """
+    The high-throughput and liver-on-chip systems exhibit enhanced in vivo-like functions and demonstrate the potential utility of these platforms for DILI risk assessment. Tenofovir-inarigivr-associated hepatotoxicity was observed and correlates with the clinical manifestation of DILI observed in patients."""
+    topic = "DILI"
+    environment.conduct_discussion(input_text, topic)
@@ -1,11 +1,11 @@
-from openai import OpenAI
+import time
+from agentVotes import RelevanceVote, request_vote
+from tracing import span
+from votingEngine import VotingEngine
 
 class Agent:
     """A generic agent that uses OpenAI's API to discuss topic relevance."""
 
-
-    client = OpenAI()
-
     def __init__(self, name, expertise):
         self.name = name
         self.expertise = expertise  # The specific topic or stance of the agent
@@ -16,7 +16,7 @@ class Agent:
         messages = [
             {
                 "role": "system",
-                "content": f"You are an expert with the following expertise: {self.expertise}. Please evaluate if the following text is important to {topic}. Respond with 'Relevant' or 'Not Relevant' only.",
+                "content": f"You are an expert with the following expertise: {self.expertise}. Please evaluate if the following text is important to {topic}. Classify it as 'Relevant' or 'Not Relevant' and give a one sentence rationale.",
             },
             {
                 "role": "user",
@@ -24,24 +24,20 @@ class Agent:
             },
         ]
 
-        # Call OpenAI's chat API
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages
-        )
+        # Call OpenAI's chat API with structured output, so every call gives a usable vote
+        relevance, usage = request_vote(RelevanceVote, "gpt-4o-mini", messages)
         
         # Process response
-        relevance = response.choices[0].message
         print(
-            f"{self.name} thinks the input is {relevance} to '{topic}'."
+            f"{self.name} thinks the input is {relevance.classification if relevance else 'unreadable'} to '{topic}'."
         )
-        return self.name, relevance  # Return the relevance for majority voting
+        return self.name, relevance, usage  # Return the relevance for majority voting (None if unreadable)
 
 
 class MixtureOfAgents:
     """Environment where agents discuss input relevance to a topic."""
 
-    def __init__(self):
+    def __init__(self, max_workers=None, accuracies=None, eager=True):
         # Initialize agents with different expertise
         self.agents = [
             Agent(
@@ -57,31 +53,80 @@ class MixtureOfAgents:
                 expertise="Specializes in identifying mixed liver injury patterns that show both hepatocellular and cholestatic characteristics. This classifier assesses cases where both ALT and ALP levels are elevated, indicating a combination of liver cell damage and bile flow obstruction. It provides a balanced evaluation of drug-induced liver injury risks."
             ),
         ]
+        # Bounded pool the agents are consulted on, all of them at once by default
+        self.max_workers = max_workers or len(self.agents)
+        # Votes are weighted by each agent's accuracy (VotingEngine.estimate_accuracies on a labelled
+        # run), ties go to "Not Relevant". All agents are asked at once by default; with eager=False
+        # an agent is only asked while its vote can still change the decision.
+        self.engine = VotingEngine(["Relevant", "Not Relevant"], [agent.name for agent in self.agents],
+                                   accuracies=accuracies, tie_breaker="Not Relevant", label_of=self.label_of)
+        self.eager = eager
+
+    def timed_discuss(self, agent, input_text, topic):
+        start = time.perf_counter()
+        with span("agent.vote", **{"agent.name": agent.name}) as s:
+            agent_name, relevance, usage = agent.discuss(input_text, topic)
+            s.set(**{"vote.label": self.label_of({"relevance": relevance})})
+        return {"agent_name": agent_name, "relevance": relevance, "usage": usage,
+                "latency": time.perf_counter() - start}
 
     def conduct_discussion(self, input_text, topic):
         print(f"Discussion on topic: '{topic}' for input: '{input_text}'\n")
-        results = []
-        for agent in self.agents:
-            agent_name, relevance = agent.discuss(input_text, topic)
-            results.append({"agent_name":agent_name,"relevance":relevance})
-        res = self.majority_vote(results)
+        with span("agent.discussion", **{"topic": topic}) as s:
+            results = self.discuss_all(input_text, topic)
+            res = self.majority_vote(results)
+            s.set(**{"vote.calls": len(results)})
         return res
 
+    def discuss_all(self, input_text, topic):
+        """Asks all agents concurrently and stops waiting once the majority is settled."""
+        return list(self.iter_discussion(input_text, topic))
+
+    def iter_discussion(self, input_text, topic):
+        """Yields each agent's result as soon as it arrives, until the decision is settled."""
+        tasks = {agent.name: (lambda agent=agent: self.timed_discuss(agent, input_text, topic))
+                 for agent in self.agents}
+        for vote in self.engine.iter_run(tasks, self.max_workers, self.eager):
+            if vote.result is not None:
+                yield vote.result
+
+    @staticmethod
+    def label_of(result):
+        return result.get("relevance").classification if result.get("relevance") else None
+
+    @classmethod
+    def answer(cls, result):
+        return cls.label_of(result) or "No vote"
+
+    def votes(self, results):
+        return [self.engine.vote(i.get("agent_name"), i) for i in results]
+
+    def is_decided(self, results):
+        """True once the remaining agents can no longer change the majority decision."""
+        return self.engine.is_decided(self.votes(results))
+
+    def decision(self, results):
+        """The engine's Decision: label (None without quorum), confidence and weighted tally."""
+        return self.engine.decide(self.votes(results))
+
+    def decide(self, results):
+        return self.decision(results).label or "Not Relevant"
+
     def majority_vote(self, results):
-        """Determines the majority relevance based on agent responses."""
-        votes = [i.get("relevance").content for i in results]
+        """Determines the weighted majority relevance based on agent responses."""
+        votes = [self.answer(i) for i in results]
         print(votes)
-        relevant_count = len([i for i in votes if i.lower() =="relevant"])
-        not_relevant_count = len([i for i in votes if i.lower() =="not relevant"])
-
-        if relevant_count > not_relevant_count:
-            final_decision = "Relevant"
-        else:
-            final_decision = "Not Relevant"
+        decision = self.decision(results)
+        final_decision = decision.label or "Not Relevant"
 
-        res = [{i.get("agent_name"):i.get("relevance").content }for i in results]
+        res = [{i.get("agent_name"):self.answer(i) }for i in results]
+        latency = {i.get("agent_name"): round(i.get("latency"), 2) for i in results}
+        skipped = len(self.agents) - len(results)
 
-        return (f"\nMajority decision: The input is {final_decision} to the topic.\nVotes:\n{res}")
+        return (f"\nMajority decision: The input is {final_decision} to the topic "
+                f"(confidence {decision.confidence:.2f}" + ("" if decision.quorum_met else ", no quorum") + ")."
+                f"\nVotes:\n{res}"
+                f"\nLatency (s):\n{latency}" + (f"\n{skipped} agent(s) not needed for the decision." if skipped else ""))
 
 
 if __name__ == '__main__':
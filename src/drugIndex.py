@@ -0,0 +1,256 @@
+import argparse, heapq, json, os, re, time
+from collections import defaultdict
+from difflib import SequenceMatcher
+from ingest import DEFAULT_CORPUS_DIR, DEFAULT_STORE_PATH, labels_fingerprint, load_labels
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DEFAULT_INDEX_PATH = os.path.join(ROOT_DIR, 'data', 'drug_index.json')
+# Bumped when name extraction changes, so a saved index built the old way is rebuilt
+INDEX_VERSION = 2
+
+# Lines of the title page that never hold the product name
+_SKIP_LINE_RE = re.compile(r"PRODUCT\s*MONOGRAPH|PATIENT\s*MEDICATION|SCRIBING\s*INFORMATION|"
+                           r"CONSUMER\s*INFORMATION|\bPage\b|^[^A-Za-z]*(?:[A-Za-z][^A-Za-z]*){0,2}$", re.IGNORECASE)
+# Schedule prefixes printed in front of Canadian brand names. "Pr" is unambiguous, the
+# upper case ones (N, C, G, PR, T/C) cannot be told apart from the name's first letters,
+# so names are indexed both with and without them.
+_PR_RE = re.compile(r"^Pr\s*(?=[A-Z0-9])")
+_SCHEDULE_RE = re.compile(r"^(?:PR|N|C|G|T/C)\s*(?=[A-Z0-9])")
+# The same prefixes in normalised names, longest first
+_SCHEDULE_PREFIXES = ["t c", "tc", "pr", "n", "c", "g"]
+# Dosage form and strength words stripped from the generic name line
+_FORM_WORDS = {
+    "tablet", "tablets", "capsule", "capsules", "injection", "injectable", "solution", "suspension", "oral",
+    "usp", "bp", "extended", "delayed", "release", "controlled", "film", "coated", "chewable", "sodium",
+    "hydrochloride", "calcium", "magnesium", "citrate", "for", "and", "mg", "ml", "vial", "pen", "cream",
+    "suppositories", "dispersion", "intramuscular", "vaginal", "effervescent", "inserts", "sr", "xl", "cr",
+    "house", "standard", "the", "of", "as", "in", "with", "women", "men", "children",
+}
+
+
+def normalise_name(name):
+    """Lower-cases a drug name and keeps only letters, digits and single spaces."""
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", name.lower()).split())
+
+
+def phonetic(name):
+    """Spelling-insensitive form of a normalised name, so "tamaxophin" lands near "tamoxifen"."""
+    for a, b in (("ph", "f"), ("ck", "k"), ("qu", "kw"), ("c", "k"), ("y", "i"), ("z", "s"), ("x", "ks")):
+        name = name.replace(a, b)
+    return re.sub(r"(.)\1+", r"\1", name)
+
+
+def _skeleton(name):
+    # Consonants carry most of a drug name, vowels are what gets misspelled
+    return re.sub(r"[aeiou ]", "", name)
+
+
+def _is_name(name):
+    words = name.split()
+    return len(name) >= 3 and not any(sum(c.isdigit() for c in w) >= 3 for w in words)
+
+
+def _fix_split_words(line):
+    # PyPDF2 splits words around hyphens and in the middle ("ACH -ATORVASTATIN", "Dela yed")
+    return re.sub(r"\s*-\s*", "-", line)
+
+
+def extract_names(first_page):
+    """Guesses the brand and generic names from the title page of a product monograph."""
+    lines = [_fix_split_words(line.strip()) for line in first_page.splitlines()]
+    lines = [line for line in lines if line and not _SKIP_LINE_RE.search(line)]
+    names = set()
+    for i, line in enumerate(lines[:4]):
+        # The brand name is the first line marked "Pr" or mostly in upper case
+        letters = [c for c in line if c.isalpha()]
+        if not _PR_RE.match(line) and (not letters or sum(c.isupper() for c in letters) < 0.7 * len(letters)):
+            continue
+        brand = _PR_RE.sub("", line.replace("®", "").replace("™", "")).strip()
+        brand = re.split(r"\s{2,}|\(|,", brand)[0].strip()
+        if not _is_name(normalise_name(brand)):
+            continue
+        parts = [brand]
+        if _SCHEDULE_RE.match(brand):
+            parts.append(_SCHEDULE_RE.sub("", brand))
+        # "APO-TAMOX", "ACH-ATORVASTATIN CALCIUM": the part after the maker prefix is a name too
+        parts += [part.split("-", 1)[1] for part in parts if "-" in part]
+        names.update(parts)
+        for part in parts:
+            words = [w for w in normalise_name(part).split() if w not in _FORM_WORDS]
+            if words and words != normalise_name(part).split():
+                names.add(" ".join(words))
+        # The line after the brand names the active ingredient, e.g. "Tamoxifen Tablets"
+        if i + 1 < len(lines):
+            generic = [w for w in normalise_name(lines[i + 1]).split()
+                       if w not in _FORM_WORDS and not w.isdigit()]
+            if generic and len(generic) <= 6:
+                names.add(" ".join(generic))
+        break
+    # "(as tamoxifen citrate)", "(Ursodiol Tablets)", but not acronyms like "(ADHD)"
+    for m in re.finditer(r"\(\s*(?:as\s+)?([A-Za-z][A-Za-z \-]{3,40}?)\s*\)", first_page):
+        if m.group(1).isupper():
+            continue
+        words = [w for w in normalise_name(m.group(1)).split() if w not in _FORM_WORDS]
+        if 0 < len(words) <= 3:
+            names.add(" ".join(words))
+    # Collapse repeated words ("fingolimod fingolimod")
+    names = {" ".join(dict.fromkeys(normalise_name(name).split())) for name in names}
+    return {name for name in names if _is_name(name)}
+
+
+def _name_pattern(name):
+    # The name's words as a whole word phrase, however the label spaces or hyphenates them
+    return re.compile(r"(?<![a-z0-9])" + r"[\s-]*".join(map(re.escape, name.split())) + r"(?![a-z0-9])", re.IGNORECASE)
+
+
+def drop_prefix_variants(names, text):
+    """Drops the misread one of two names that differ by a schedule prefix ("gilenya" / "ilenya").
+
+    The title page cannot tell "CONTRAVE" from a "C" schedule mark in front
+    of "ONTRAVE", so both are extracted; the label text names the product
+    many times, so the spelling it uses less often is dropped.
+    """
+    names = set(names)
+    counts = {}
+    for long in sorted(names, key=len, reverse=True):
+        for prefix in _SCHEDULE_PREFIXES:
+            short = long[len(prefix):].lstrip() if long.startswith(prefix) else None
+            if not short or short not in names or long not in names:
+                continue
+            for name in (long, short):
+                if name not in counts:
+                    counts[name] = len(_name_pattern(name).findall(text))
+            names.discard(short if counts[long] > counts[short] else long)
+    return names
+
+
+def _trigrams(name):
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class DrugIndex:
+    """Maps brand and generic names to label files, with a trigram index for fuzzy lookups."""
+
+    def __init__(self, names, corpus_dir, fingerprint=None):
+        self.names = {name: sorted(paths) for name, paths in names.items()}  # name -> relative label paths
+        self.corpus_dir = corpus_dir
+        self.fingerprint = fingerprint  # ingest.labels_fingerprint() of the labels it was built from
+        self._name_list = sorted(self.names)
+        self._phonetic = [phonetic(name) for name in self._name_list]
+        self._skeletons = [_skeleton(name) for name in self._phonetic]
+        self._gram_counts = [len(_trigrams(name)) for name in self._phonetic]
+        self._postings = defaultdict(list)  # trigram of the phonetic form -> ids into _name_list
+        for i, name in enumerate(self._phonetic):
+            for gram in _trigrams(name):
+                self._postings[gram].append(i)
+
+    @classmethod
+    def build(cls, corpus_dir=DEFAULT_CORPUS_DIR, store_path=DEFAULT_STORE_PATH):
+        """Reads the title page of every label, from the ingested page store when there is one."""
+        fingerprint = labels_fingerprint(corpus_dir, store_path)
+        names = defaultdict(set)
+        for rel_path, pages in load_labels(corpus_dir, store_path).items():
+            if not pages:
+                continue
+            for name in drop_prefix_variants(extract_names(pages[0]), "\n".join(pages)):
+                names[name].add(rel_path)
+        return cls(names, os.path.abspath(corpus_dir), fingerprint)
+
+    def save(self, path=DEFAULT_INDEX_PATH):
+        with open(path, "w") as f:
+            json.dump({"version": INDEX_VERSION, "fingerprint": self.fingerprint,
+                       "corpus_dir": os.path.relpath(self.corpus_dir, os.path.dirname(os.path.abspath(path))),
+                       "names": self.names}, f, indent=1, sort_keys=True)
+
+    @classmethod
+    def load(cls, path=DEFAULT_INDEX_PATH):
+        """The saved index, or None when it was built by another INDEX_VERSION."""
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION:
+            return None
+        return cls(data["names"], os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(path)),
+                                                                data["corpus_dir"])), data.get("fingerprint"))
+
+    def search(self, query, limit=5, min_score=0.5):
+        """Returns [(score, name)] best first; exact names score 1.0, others by trigram and edit similarity."""
+        query = normalise_name(query)
+        if not query:
+            return []
+        if query in self.names:
+            return [(1.0, query)]
+        query_phonetic = phonetic(query)
+        grams = _trigrams(query_phonetic)
+        shared = defaultdict(int)
+        for gram in grams:
+            for i in self._postings.get(gram, ()):
+                shared[i] += 1
+        # Dice coefficient on trigrams shortlists candidates, edit similarity decides between them
+        shortlist = heapq.nlargest(10, shared, key=lambda i: shared[i] / (len(grams) + self._gram_counts[i]))
+        query_skeleton = _skeleton(query_phonetic)
+        results = []
+        for i in shortlist:
+            score = (SequenceMatcher(None, query_phonetic, self._phonetic[i]).ratio() +
+                     SequenceMatcher(None, query_skeleton, self._skeletons[i]).ratio()) / 2
+            if score >= min_score:
+                results.append((score, self._name_list[i]))
+        return sorted(results, reverse=True)[:limit]
+
+    def lookup(self, query):
+        """Returns the label path for a drug name or alias on the index, or None.
+
+        Only exact names resolve: a close spelling can be another drug
+        ("omeprazole" / "esomeprazole"), so near matches are offered by
+        suggest() instead of being answered for.
+        """
+        paths = self.names.get(normalise_name(query))
+        return os.path.join(self.corpus_dir, paths[0]) if paths else None
+
+    def suggest(self, query, limit=3, min_score=0.6):
+        """Indexed names close to a name that is not on the index, best first."""
+        return [name for _, name in self.search(query, limit=limit, min_score=min_score)]
+
+    def not_found_message(self, query):
+        """"No label found" for a name, with the closest indexed names as a did-you-mean."""
+        suggestions = self.suggest(query)
+        message = f"No label found for drug name '{query}'."
+        return message + (f" Did you mean: {', '.join(suggestions)}?" if suggestions else "")
+
+
+_default_index = None
+
+def get_drug_index(path=DEFAULT_INDEX_PATH):
+    """Returns the process-wide DrugIndex, building and saving it on first use if needed.
+
+    A saved index is rebuilt when the labels of the corpus (or the ingested
+    store) have changed since it was built.
+    """
+    global _default_index
+    if _default_index is None:
+        if os.path.exists(path):
+            _default_index = DrugIndex.load(path)
+        if _default_index is not None and _default_index.fingerprint != labels_fingerprint():
+            _default_index = None
+        if _default_index is None:
+            _default_index = DrugIndex.build()
+            _default_index.save(path)
+    return _default_index
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the drug name index over the label corpus.")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS_DIR)
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="ingested page store, used when present")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH)
+    parser.add_argument("--query", nargs="*", help="names to look up after building")
+    args = parser.parse_args()
+    index = DrugIndex.build(args.corpus, args.store)
+    index.save(args.index)
+    print(f"Indexed {len(index.names)} names from {args.corpus} into {args.index}")
+    for query in args.query or []:
+        start = time.perf_counter()
+        path = index.lookup(query)
+        results = index.search(query)
+        print(f"{query!r}: {path or index.not_found_message(query)} {results} "
+              f"({(time.perf_counter() - start) * 1000:.2f} ms)")
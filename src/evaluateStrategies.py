@@ -0,0 +1,224 @@
+import argparse, csv, json, os, time
+from contextlib import nullcontext
+from batchClassify import expected_label
+from ingest import DEFAULT_CORPUS_DIR, find_pdfs
+from mockLLM import MockLLMServer
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DEFAULT_OUTPUT = os.path.join(ROOT_DIR, 'data', 'evaluation.json')
+# The folders of the corpus that are ground truth
+LABELLED_FOLDERS = ["dili", "non_dili"]
+DILI_LABELS = {"dili": "Relevant", "non_dili": "Not Relevant"}
+
+
+def labelled_documents(corpus_dir=None, limit=None):
+    """(relative path, expected label, text) of the labels in the dili and non_dili folders.
+
+    The text is what Agent TOI reads: the sections found by heading on the
+    adverse event pages, or those pages when no heading is found.
+    """
+    from pdfCache import get_default_cache
+    from sectionSplitter import split_AE_sections
+    corpus_dir = corpus_dir or DEFAULT_CORPUS_DIR
+    documents = []
+    for folder in LABELLED_FOLDERS:
+        paths = [p for p in find_pdfs(corpus_dir) if p.split(os.sep)[0] == folder][:limit]
+        for rel_path in paths:
+            text = get_default_cache().get_AE_text(os.path.join(corpus_dir, rel_path))
+            documents.append((rel_path, expected_label(rel_path), "\n".join(split_AE_sections(text) or [text])))
+    return documents
+
+
+# Each strategy builds its agents once and returns classify(text) -> "Relevant", "Not Relevant" or None
+
+def mixture_strategy():
+    from demo_openai import MixtureOfAgents
+    environment = MixtureOfAgents()
+    return lambda text: environment.decide(environment.discuss_all(text, "DILI"))
+
+
+def cascade_strategy():
+    from cascade import Cascade
+    from demo_openai import MixtureOfAgents
+    router = Cascade(MixtureOfAgents())
+    return lambda text: router.classify(text, "DILI", ae_text=True).label
+
+
+def majority_voting_strategy():
+    from swarms.structs.majority_voting import MajorityVoting
+    import demo_majorityVoting
+    voting = MajorityVoting(agents=demo_majorityVoting.build_agents(),
+                            output_parser=demo_majorityVoting.majority_voting)
+
+    def classify(text):
+        result = voting.run(f"Is the following text DILI-related: {text}")
+        return DILI_LABELS.get(result.get("classification")) if isinstance(result, dict) else None
+    return classify
+
+
+def moe_strategy():
+    from agentVotes import RelevanceVote, request_vote
+    import demo_moe
+    moe_swarm = demo_moe.build_swarm()
+
+    def classify(text):
+        history = moe_swarm.run(task=demo_moe.format_task(text))
+        # The aggregator answers in free text, its verdict is extracted with one structured output call
+        vote, _ = request_vote(RelevanceVote, "gpt-4o-mini", [
+            {"role": "system", "content": "Extract whether this answer finds the text DILI related: "
+                                          "'Relevant' or 'Not Relevant'."},
+            {"role": "user", "content": str(history)[-8000:]},
+        ])
+        return vote.classification if vote else None
+    return classify
+
+
+STRATEGIES = {
+    "mixture": mixture_strategy,                  # demo_openai.MixtureOfAgents, three weighted votes
+    "cascade": cascade_strategy,                  # lexicon and local model tiers before the mixture
+    "majority_voting": majority_voting_strategy,  # swarms MajorityVoting of demo_majorityVoting
+    "moe": moe_strategy,                          # swarms MixtureOfAgents aggregator of demo_moe
+}
+# Strategies whose API requests bypass llmClient, so --live cannot count their calls and tokens
+UNMETERED_LIVE = {"majority_voting", "moe"}
+
+
+def evaluate(classify, documents, meter):
+    """Classifies the documents one after the other, returns a row per document.
+
+    meter() returns the (calls, tokens) served so far; documents run
+    sequentially so each gets exactly the calls and tokens it caused.
+    Without a meter calls and tokens are None (not measured).
+    """
+    meter = meter or (lambda: (None, None))
+    rows = []
+    for rel_path, expected, text in documents:
+        calls, tokens = meter()
+        start = time.perf_counter()
+        try:
+            predicted, error = classify(text), None
+        except Exception as e:
+            print(f"{rel_path} failed: {e}")
+            predicted, error = None, str(e)
+        seconds = time.perf_counter() - start
+        calls_after, tokens_after = meter()
+        measured = calls is not None
+        rows.append({"path": rel_path, "expected": expected, "predicted": predicted, "correct": predicted == expected,
+                     "calls": calls_after - calls if measured else None,
+                     "tokens": tokens_after - tokens if measured else None,
+                     "seconds": round(seconds, 3), "error": error})
+    return rows
+
+
+def summarize(rows):
+    n = len(rows)
+    measured = all(row["calls"] is not None for row in rows)
+    confusion = {}
+    for row in rows:
+        predicted = confusion.setdefault(row["expected"], {})
+        predicted[row["predicted"] or "No answer"] = predicted.get(row["predicted"] or "No answer", 0) + 1
+    return {
+        "documents": n,
+        "accuracy": sum(row["correct"] for row in rows) / n if n else None,
+        "errors": sum(1 for row in rows if row["error"]),
+        "cost_measured": measured,
+        "calls_per_document": sum(row["calls"] for row in rows) / n if n and measured else None,
+        "tokens_per_document": sum(row["tokens"] for row in rows) / n if n and measured else None,
+        "seconds_per_document": sum(row["seconds"] for row in rows) / n if n else None,
+        "confusion": confusion,
+    }
+
+
+def cost_accuracy_frontier(summaries):
+    """Strategy names ordered by tokens per document, keeping those no cheaper strategy matches in accuracy."""
+    frontier, best = [], -1.0
+    for name, summary in sorted(summaries.items(), key=lambda item: (item[1]["tokens_per_document"],
+                                                                     -item[1]["accuracy"])):
+        if summary["accuracy"] > best:
+            frontier.append(name)
+            best = summary["accuracy"]
+    return frontier
+
+
+def cheapest(summaries, min_accuracy):
+    """The strategy with the fewest tokens per document whose accuracy meets min_accuracy, or None."""
+    eligible = [name for name, summary in summaries.items() if summary["accuracy"] >= min_accuracy]
+    return min(eligible, key=lambda name: summaries[name]["tokens_per_document"], default=None)
+
+
+def run(strategies, corpus_dir=None, limit=None, live=False, cache=False, latency=0.2, tokens_per_second=200.0,
+        min_accuracy=None):
+    """Evaluates the strategies on the labelled folders, against the mock LLM server unless live."""
+    from tracing import MemorySink, add_sink, remove_sink
+    documents = labelled_documents(corpus_dir, limit)
+    print(f"{len(documents)} labelled documents")
+    report = {"config": {"documents": len(documents), "live": live, "cache": cache, "latency": latency,
+                         "tokens_per_second": tokens_per_second}, "strategies": {}, "documents": {}}
+    if not cache:
+        os.environ["LLM_CACHE_BACKEND"] = "off"
+    sink = add_sink(MemorySink())
+    server = None if live else MockLLMServer(latency=latency, tokens_per_second=tokens_per_second)
+    with server or nullcontext():
+        if server:
+            os.environ["OPENAI_BASE_URL"] = server.url + "/v1"
+            os.environ["OPENAI_API_KEY"] = "mock"
+            os.environ["OLLAMA_HOST"] = server.url
+            meter = lambda: (server.total_calls(), server.total_tokens())
+        else:
+            import config
+            config.init()
+            # Requests the pipeline's own clients made; the UNMETERED_LIVE strategies call the API past them
+            def meter():
+                requests = [s for s in list(sink.spans) if "gen_ai.system" in s.attributes]
+                return len(requests), sum(s.attributes.get("gen_ai.usage.input_tokens", 0) +
+                                          s.attributes.get("gen_ai.usage.output_tokens", 0) for s in requests)
+        for name in strategies:
+            try:
+                classify = STRATEGIES[name]()
+            except Exception as e:
+                print(f"Skipping {name}: {e}")
+                report["strategies"][name] = {"skipped": str(e)}
+                continue
+            print(f"Evaluating {name}")
+            start = time.perf_counter()
+            rows = evaluate(classify, documents, None if live and name in UNMETERED_LIVE else meter)
+            report["strategies"][name] = dict(summarize(rows), wall_clock=time.perf_counter() - start)
+            report["documents"][name] = rows
+    remove_sink(sink)
+    # A strategy whose cost was not measured can be neither on the frontier nor the cheapest
+    summaries = {name: s for name, s in report["strategies"].items()
+                 if "skipped" not in s and s["documents"] and s["cost_measured"]}
+    report["frontier"] = cost_accuracy_frontier(summaries)
+    if min_accuracy is not None:
+        report["cheapest"] = cheapest(summaries, min_accuracy)
+    return report
+
+
+def write_documents(report, path):
+    """One row per strategy and document, for plotting cost against accuracy."""
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["strategy", "path", "expected", "predicted", "correct", "calls",
+                                               "tokens", "seconds", "error"])
+        writer.writeheader()
+        for name, rows in report["documents"].items():
+            writer.writerows(dict(row, strategy=name) for row in rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Evaluate the classification strategies on the dili / non_dili labels.")
+    parser.add_argument("--strategies", nargs="+", default=list(STRATEGIES), choices=list(STRATEGIES))
+    parser.add_argument("--corpus", default=None, help="default data/hc")
+    parser.add_argument("--limit", type=int, default=None, help="labels per folder")
+    parser.add_argument("--live", action="store_true", help="call the real APIs instead of the mock server")
+    parser.add_argument("--cache", action="store_true", help="keep the LLM response cache on")
+    parser.add_argument("--latency", type=float, default=0.2, help="mock seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--min-accuracy", type=float, default=None, help="report the cheapest strategy meeting it")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON report, per-document rows next to it as CSV")
+    args = parser.parse_args()
+    report = run(args.strategies, args.corpus, args.limit, args.live, args.cache, args.latency,
+                 args.tokens_per_second, args.min_accuracy)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    write_documents(report, os.path.splitext(args.output)[0] + "_documents.csv")
+    print(json.dumps({key: value for key, value in report.items() if key != "documents"}, indent=2))
@@ -0,0 +1,182 @@
+import argparse, json, os, sqlite3, threading, time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pdfCache import EXTRACTOR_VERSION, get_default_cache
+from sectionSplitter import SPLITTER_VERSION
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DEFAULT_STORE_PATH = os.path.join(ROOT_DIR, 'data', 'evidence.sqlite')
+
+# What an entry is computed with; entries computed with anything else are stale. Bump "pipeline"
+# when a prompt or a step of the chain changes, and the model names when agentUtils,
+# demo_openai or cascade switch models.
+MODEL_VERSIONS = {
+    "pipeline": 4,
+    "pdf_extractor": EXTRACTOR_VERSION,
+    "section_splitter": SPLITTER_VERSION,
+    "sections_model": "gpt-4o-mini",
+    "keywords_model": "gpt-4o-mini",
+    "vote_model": "gpt-4o-mini",
+    "local_model": "llama3.2",
+}
+
+Evidence = namedtuple("Evidence", ["path", "digest", "sections", "keywords", "label", "confidence", "tier",
+                                   "created"])
+
+
+class EvidenceStore:
+    """Sections, DILI keywords and classification of each label, computed once offline.
+
+    Entries are keyed by the PDF content hash and the model versions, so
+    lookup() never serves evidence for a label that has changed or was
+    computed with other models; those are recomputed by precompute().
+    """
+
+    def __init__(self, path=None, versions=None):
+        self.path = path or os.environ.get("EVIDENCE_STORE_PATH", DEFAULT_STORE_PATH)
+        self.versions = json.dumps(versions or MODEL_VERSIONS, sort_keys=True)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS evidence (digest TEXT NOT NULL, versions TEXT NOT NULL, "
+                           "path TEXT, sections TEXT NOT NULL, keywords TEXT NOT NULL, label TEXT, confidence REAL, "
+                           "tier TEXT, created REAL NOT NULL, PRIMARY KEY (digest, versions))")
+        self._conn.commit()
+
+    def get(self, digest):
+        with self._lock:
+            row = self._conn.execute("SELECT path, digest, sections, keywords, label, confidence, tier, created "
+                                     "FROM evidence WHERE digest = ? AND versions = ?",
+                                     (digest, self.versions)).fetchone()
+        if row is None:
+            return None
+        return Evidence(row[0], row[1], json.loads(row[2]), json.loads(row[3]), *row[4:])
+
+    def lookup(self, file_path):
+        """The current evidence for a label PDF, or None when it was never computed or is stale."""
+        if not file_path or not os.path.exists(file_path):
+            return None
+        return self.get(get_default_cache().digest(file_path))
+
+    def put(self, file_path, sections, keywords, decision, digest=None):
+        digest = digest or get_default_cache().digest(file_path)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO evidence VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                               (digest, self.versions, file_path, json.dumps(sections), json.dumps(keywords),
+                                decision.label, decision.confidence, decision.tier, time.time()))
+            self._conn.commit()
+
+    def prune(self, keep_digests=None):
+        """Deletes entries of other model versions, and of labels not in keep_digests when given."""
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM evidence WHERE versions != ?", (self.versions,)).rowcount
+            if keep_digests is not None:
+                current = [row[0] for row in self._conn.execute("SELECT digest FROM evidence")]
+                stale = [(digest,) for digest in current if digest not in keep_digests]
+                self._conn.executemany("DELETE FROM evidence WHERE digest = ?", stale)
+                removed += len(stale)
+            self._conn.commit()
+        return removed
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT label, COUNT(*) FROM evidence WHERE versions = ? GROUP BY label",
+                                      (self.versions,)).fetchall()
+        return {"entries": sum(count for _, count in rows), "labels": dict(rows)}
+
+
+def compute_evidence(file_path, context_variables=None):
+    """Runs the full chain for one label and returns (sections, keywords, TierDecision).
+
+    Sections and keywords come from agentUtils.collect_evidence, as in Agent
+    TOI. The classification is the cascade's (and if needed the agents'
+    vote) on the extracted keywords, which is what Agent DILI answers from;
+    only sections without any liver term are decided by the keyword rule.
+    """
+    from agentUtils import collect_evidence
+    from cascade import get_cascade
+    from hepatoLexicon import get_lexicon
+    context_variables = dict({"verbose": False}, **(context_variables or {}))
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    sections, keywords = collect_evidence(name, file_path, context_variables)
+    # Errors are not stored, the label is tried again on the next run
+    if not isinstance(sections, list):
+        raise RuntimeError(sections)
+    errors = [value for value in keywords.values() if str(value).startswith("Error")]
+    if errors:
+        raise RuntimeError(errors[0])
+    sections_text = "\n".join(sections)
+    if sections and not get_lexicon().scan(sections_text):
+        return sections, keywords, get_cascade().classify(sections_text, "DILI", ae_text=True)
+    text = "\n".join(f"{section}: {value}" for section, value in keywords.items()) or "No DILI information was found."
+    return sections, keywords, get_cascade().classify(text, "DILI")
+
+
+def precompute(corpus_dir=None, store=None, workers=4, force=False, prune_missing=False):
+    """Computes the evidence of every label in the corpus that is missing or stale.
+
+    Entries of other model versions are deleted. With prune_missing, so are
+    entries of labels that are no longer in the default corpus (data/hc),
+    whichever part of it corpus_dir is.
+    """
+    from cascade import format_confidence
+    from ingest import DEFAULT_CORPUS_DIR, find_pdfs
+    corpus_dir = corpus_dir or DEFAULT_CORPUS_DIR
+    store = store or get_evidence_store()
+    paths = [os.path.join(corpus_dir, p) for p in find_pdfs(corpus_dir)]
+    todo = [path for path in paths if force or store.lookup(path) is None]
+    print(f"{len(paths) - len(todo)} of {len(paths)} labels up to date, computing {len(todo)}")
+    start = time.time()
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(compute_evidence, path): path for path in todo}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                sections, keywords, decision = future.result()
+            except Exception as e:
+                print(f"Failed on {path}: {e}")
+                failed.append(path)
+                continue
+            store.put(path, sections, keywords, decision)
+            print(f"{os.path.relpath(path, corpus_dir)}: {decision.label} "
+                  f"({decision.tier}, {format_confidence(decision.confidence)})")
+    keep = None
+    if prune_missing:
+        corpus_paths = [os.path.join(DEFAULT_CORPUS_DIR, p) for p in find_pdfs(DEFAULT_CORPUS_DIR)]
+        keep = {get_default_cache().digest(path) for path in corpus_paths + paths}
+    removed = store.prune(keep)
+    summary = {"labels": len(paths), "computed": len(todo) - len(failed), "failed": len(failed),
+               "removed": removed, "seconds": time.time() - start}
+    print(summary)
+    return summary
+
+
+_default_store = None
+
+def get_evidence_store():
+    """Returns the process-wide EvidenceStore on EVIDENCE_STORE_PATH (default data/evidence.sqlite)."""
+    global _default_store
+    if _default_store is None:
+        _default_store = EvidenceStore()
+    return _default_store
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Precompute the DILI evidence of every label in the corpus.")
+    parser.add_argument("--corpus", default=None, help="default data/hc")
+    parser.add_argument("--store", default=None, help="default EVIDENCE_STORE_PATH or data/evidence.sqlite")
+    parser.add_argument("--workers", type=int, default=4, help="labels computed at once")
+    parser.add_argument("--force", action="store_true", help="recompute labels that are up to date")
+    parser.add_argument("--prune-missing", action="store_true",
+                        help="also delete the evidence of labels no longer in data/hc")
+    parser.add_argument("--drug", help="show the stored evidence of a drug instead")
+    args = parser.parse_args()
+    store = EvidenceStore(args.store)
+    if args.drug:
+        from drugIndex import get_drug_index
+        print(store.lookup(get_drug_index().lookup(args.drug)))
+    else:
+        precompute(args.corpus, store, args.workers, args.force, args.prune_missing)
+        print(store.stats())
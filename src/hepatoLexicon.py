@@ -0,0 +1,201 @@
+import argparse, bisect, os, re, time
+from collections import Counter, namedtuple
+
+# Canonical liver injury terms (MedDRA preferred term style) and the phrasings labels use for them.
+# Synonyms are case-insensitive phrases; spaces also match hyphens and line breaks.
+LEXICON = {
+    "drug-induced liver injury": ["drug-induced liver injury", "drug induced hepatotoxicity", "liver injury",
+                                  "hepatic injury", "hepatocellular injury", "liver damage", "hepatic damage"],
+    "hepatotoxicity": ["hepatotoxicity", "hepatotoxic", "liver toxicity", "hepatic toxicity"],
+    "hepatitis": ["hepatitis", "hepatic inflammation", "hepatocellular hepatitis", "autoimmune hepatitis",
+                  "cytolytic hepatitis"],
+    "fulminant hepatitis": ["fulminant hepatitis"],
+    "hepatic failure": ["hepatic failure", "liver failure", "acute liver failure", "hepatic decompensation"],
+    # The population a dose is adjusted for ("patients with hepatic insufficiency"), not an outcome
+    "hepatic impairment": ["hepatic impairment", "liver impairment", "hepatic insufficiency", "liver insufficiency",
+                           "impaired hepatic function", "impaired liver function"],
+    "hepatic necrosis": ["hepatic necrosis", "liver necrosis", "hepatocellular necrosis", "hepatocyte necrosis"],
+    "liver transplant": ["liver transplant", "liver transplantation", "hepatic transplantation"],
+    "fatal hepatic outcome": ["hepatic death", "liver-related death", "hepatic fatalities", "liver fatalities"],
+    "jaundice": ["jaundice", "icterus", "yellowing of the skin", "yellowing of the eyes", "yellow skin",
+                 "yellow eyes"],
+    "cholestasis": ["cholestasis", "cholestatic", "intrahepatic cholestasis", "cholestatic hepatitis",
+                    "cholestatic jaundice"],
+    "hepatic steatosis": ["hepatic steatosis", "fatty liver", "steatohepatitis", "liver steatosis"],
+    "hepatomegaly": ["hepatomegaly", "enlarged liver", "liver enlargement"],
+    "hepatic encephalopathy": ["hepatic encephalopathy"],
+    "veno-occlusive disease": ["veno-occlusive disease", "hepatic veno-occlusive", "sinusoidal obstruction syndrome"],
+    "hepatic enzyme increased": ["hepatic enzymes", "liver enzymes", "liver function tests", "liver function test",
+                                 "abnormal liver function", "hepatic function abnormal", "liver test abnormalities"],
+    "transaminases increased": ["transaminases", "transaminase", "aminotransferases", "aminotransferase",
+                                "transaminitis"],
+    "ALT increased": ["alanine aminotransferase", "alanine transaminase"],
+    "AST increased": ["aspartate aminotransferase", "aspartate transaminase"],
+    "ALP increased": ["alkaline phosphatase"],
+    "GGT increased": ["gamma-glutamyl transferase", "gamma-glutamyltransferase", "gamma glutamyl transpeptidase"],
+    "bilirubin increased": ["bilirubin", "hyperbilirubinemia", "hyperbilirubinaemia", "bilirubinemia"],
+    "Hy's law": ["Hy's law", "Hy’s law"],
+    "hepatobiliary disorders": ["hepatobiliary disorders", "hepatobiliary disorder"],
+}
+# Qualifiers matched as regular expressions (case-insensitive). The lookahead leaves the liver term
+# that follows to be matched as well, e.g. "fatal hepatic failure" is also "hepatic failure".
+PATTERNS = {
+    "fulminant hepatitis": [r"fulminant(?=[\s-]+(?:hepat|liver))"],
+    "fatal hepatic outcome": [r"fatal(?=[\s-]+(?:hepat|liver))"],
+    # Any other mention of the liver, tried after the phrases so "liver metabolism" still counts as a hit
+    "hepatobiliary disorders": [r"(?:hepat|liver|cholesta)\w*"],
+}
+# Abbreviations, matched case-sensitively so "alt" or "ast" in running text do not count
+ABBREVIATIONS = {
+    "drug-induced liver injury": ["DILI"],
+    "ALT increased": ["ALT", "SGPT"],
+    "AST increased": ["AST", "SGOT"],
+    "ALP increased": ["ALP"],
+    "GGT increased": ["GGT", "GGTP"],
+    "hepatic enzyme increased": ["LFTs", "LFT"],
+    "bilirubin increased": ["TBL"],
+}
+# Outcomes that only serious liver injury produces
+SEVERE_TERMS = {"hepatic failure", "liver transplant", "fulminant hepatitis", "hepatic necrosis",
+                "fatal hepatic outcome", "hepatotoxicity"}
+
+Hit = namedtuple("Hit", ["term", "text", "start", "end"])
+
+# Separates documents in a batched scan; never part of a match
+_DOC_SEPARATOR = "\x00"
+
+
+def normalise_phrase(text):
+    """Lower case, hyphens and runs of whitespace as one space: how matched text is looked up."""
+    return re.sub(r"[\s-]+", " ", text.strip().lower())
+
+
+def _trie_pattern(phrases):
+    """One regex for many phrases, shaped as their prefix tree so each character is tried once.
+
+    Spaces in the phrases match any run of whitespace or hyphens. Optional
+    tails are greedy, so the longest phrase matches first.
+    """
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def emit(node):
+        alternatives = [(r"[\s-]+" if char == " " else re.escape(char)) + emit(child)
+                        for char, child in sorted(node.items()) if char]
+        if not alternatives:
+            return ""
+        body = alternatives[0] if len(alternatives) == 1 and "" not in node else f"(?:{'|'.join(alternatives)})"
+        return body + "?" if "" in node else body
+    return emit(trie)
+
+
+class HepatoLexicon:
+    """Liver injury terms compiled into a single regular expression.
+
+    The synonyms form one prefix tree (trie) pattern, so the regex engine
+    tries each character once instead of each synonym in turn, and the
+    longest phrasing wins. A match is mapped back to its canonical term by
+    a dictionary lookup. Scanning is one pass over the text, or over a whole
+    corpus joined with separators.
+    """
+
+    def __init__(self, lexicon=None, abbreviations=None, patterns=None, severe_terms=None):
+        lexicon = LEXICON if lexicon is None else lexicon
+        abbreviations = ABBREVIATIONS if abbreviations is None else abbreviations
+        patterns = PATTERNS if patterns is None else patterns
+        self.severe_terms = SEVERE_TERMS if severe_terms is None else set(severe_terms)
+        self.phrase_terms = {normalise_phrase(phrase): term for term, phrases in lexicon.items() for phrase in phrases}
+        self.abbreviation_terms = {abbreviation: term for term, abbreviations in abbreviations.items()
+                                   for abbreviation in abbreviations}
+        self.group_terms = {}
+        alternatives = [f"(?P<phrase>(?i:{_trie_pattern(self.phrase_terms)}))",
+                        f"(?P<abbreviation>{_trie_pattern(self.abbreviation_terms)})"]
+        for i, (term, pattern) in enumerate((term, pattern) for term, term_patterns in patterns.items()
+                                            for pattern in term_patterns):
+            self.group_terms[f"p{i}"] = term
+            alternatives.append(f"(?P<p{i}>(?i:{pattern}))")
+        # Whole words only: no letter or digit directly before or after
+        self.regex = re.compile(r"(?<!\w)(?:" + "|".join(alternatives) + r")(?!\w)")
+        self.terms = sorted(set(self.phrase_terms.values()) | set(self.abbreviation_terms.values()) |
+                            set(self.group_terms.values()))
+
+    def _term(self, match):
+        if match.lastgroup == "phrase":
+            return self.phrase_terms[normalise_phrase(match.group())]
+        if match.lastgroup == "abbreviation":
+            return self.abbreviation_terms[match.group()]
+        return self.group_terms[match.lastgroup]
+
+    def scan(self, text):
+        """All term hits in the text, in order, with their offsets."""
+        return [Hit(self._term(m), m.group(), m.start(), m.end()) for m in self.regex.finditer(text)]
+
+    def has_hits(self, text):
+        return self.regex.search(text) is not None
+
+    def term_counts(self, text):
+        return Counter(hit.term for hit in self.scan(text))
+
+    def severe(self, hits):
+        """The distinct severe outcome terms among hits."""
+        return {hit.term for hit in hits} & self.severe_terms
+
+    def scan_corpus(self, documents):
+        """Scans {document id: text} in one pass, returns {document id: [Hit]} with offsets per document."""
+        ids = list(documents)
+        texts = [str(documents[doc_id]).replace(_DOC_SEPARATOR, " ") for doc_id in ids]
+        starts, offset = [], 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + len(_DOC_SEPARATOR)
+        hits = {doc_id: [] for doc_id in ids}
+        for m in self.regex.finditer(_DOC_SEPARATOR.join(texts)):
+            i = bisect.bisect_right(starts, m.start()) - 1
+            hits[ids[i]].append(Hit(self._term(m), m.group(), m.start() - starts[i], m.end() - starts[i]))
+        return hits
+
+
+def format_terms(hits):
+    """Canonical terms of the hits as a keyword list, most frequent first, like the LLM keyword answers."""
+    counts = Counter(hit.term for hit in hits)
+    return "\n".join(f"- {term}" for term, _ in counts.most_common())
+
+
+_default_lexicon = None
+
+def get_lexicon():
+    """Returns the process-wide HepatoLexicon, compiled on first use."""
+    global _default_lexicon
+    if _default_lexicon is None:
+        _default_lexicon = HepatoLexicon()
+    return _default_lexicon
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Scan every label for liver injury terms in one pass.")
+    parser.add_argument("--store", default=None, help="Parquet page store, default data/hc_pages.parquet; "
+                                                      "the PDFs of data/hc are read when there is none")
+    parser.add_argument("--top", type=int, default=5, help="terms shown per label")
+    args = parser.parse_args()
+    from ingest import DEFAULT_CORPUS_DIR, DEFAULT_STORE_PATH, find_pdfs, load_store
+    store_path = args.store or DEFAULT_STORE_PATH
+    if os.path.exists(store_path):
+        labels = load_store(store_path)
+    else:
+        from pdfCache import get_default_cache
+        labels = {path: get_default_cache().get_pages(os.path.join(DEFAULT_CORPUS_DIR, path))
+                  for path in find_pdfs(DEFAULT_CORPUS_DIR)}
+    lexicon = get_lexicon()
+    start = time.perf_counter()
+    hits = lexicon.scan_corpus({path: "".join(pages) for path, pages in labels.items()})
+    seconds = time.perf_counter() - start
+    for path, label_hits in sorted(hits.items()):
+        counts = Counter(hit.term for hit in label_hits)
+        severe = sorted(lexicon.severe(label_hits))
+        print(f"{path:28s} {len(label_hits):4d} hits  severe={severe}  top={counts.most_common(args.top)}")
+    characters = sum(len(page) for pages in labels.values() for page in pages)
+    print(f"Scanned {len(labels)} labels ({characters / 1e6:.1f}M characters) in {seconds:.3f}s")
@@ -0,0 +1,147 @@
+import argparse, hashlib, json, os, time
+from concurrent.futures import ProcessPoolExecutor
+from pdfCache import get_default_cache
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DEFAULT_CORPUS_DIR = os.path.join(ROOT_DIR, 'data', 'hc')
+DEFAULT_STORE_PATH = os.path.join(ROOT_DIR, 'data', 'hc_pages.parquet')
+
+
+def store_schema():
+    # pyarrow is imported when the store is read or written, not by modules that only need the paths
+    import pyarrow as pa
+    return pa.schema([
+        ("label_id", pa.string()),    # file stem, e.g. 00064472
+        ("category", pa.string()),    # sub folder, e.g. dili / non_dili, empty at the corpus root
+        ("path", pa.string()),        # relative to the corpus directory
+        ("sha256", pa.string()),
+        ("size", pa.int64()),
+        ("mtime_ns", pa.int64()),
+        ("page", pa.int32()),
+        ("text", pa.large_string()),
+    ])
+
+
+def find_pdfs(corpus_dir):
+    """Walks the corpus directory and returns the relative paths of all PDFs."""
+    paths = []
+    for dirpath, _, filenames in os.walk(corpus_dir):
+        for filename in filenames:
+            if filename.lower().endswith('.pdf'):
+                paths.append(os.path.relpath(os.path.join(dirpath, filename), corpus_dir))
+    return sorted(paths)
+
+
+def load_store(store_path=DEFAULT_STORE_PATH):
+    """Returns {relative path: [page texts]} from an ingested corpus store."""
+    import pyarrow.parquet as pq
+    table = pq.read_table(store_path, columns=["path", "page", "text"])
+    labels = {}
+    for path, page, text in zip(*(table.column(c).to_pylist() for c in ("path", "page", "text"))):
+        labels.setdefault(path, []).append((page, text))
+    return {path: [text for _, text in sorted(pages)] for path, pages in labels.items()}
+
+
+def load_labels(corpus_dir=DEFAULT_CORPUS_DIR, store_path=DEFAULT_STORE_PATH):
+    """{relative path: [page texts]} from the ingested store, or from the PDFs (text cache) before ingestion."""
+    if os.path.exists(store_path):
+        return load_store(store_path)
+    return {rel_path: get_default_cache().get_pages(os.path.join(corpus_dir, rel_path))
+            for rel_path in find_pdfs(corpus_dir)}
+
+
+def labels_fingerprint(corpus_dir=DEFAULT_CORPUS_DIR, store_path=DEFAULT_STORE_PATH):
+    """Changes when a label PDF is added, removed or modified, or the store is re-ingested.
+
+    Indexes built from load_labels() save it and are rebuilt when it no
+    longer matches. Only file sizes and mtimes are read, not the files.
+    """
+    def stat(path):
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime_ns]
+    sources = [[rel_path] + stat(os.path.join(corpus_dir, rel_path)) for rel_path in find_pdfs(corpus_dir)]
+    if os.path.exists(store_path):
+        sources.append(["store"] + stat(store_path))
+    return hashlib.sha256(json.dumps(sources).encode("utf-8")).hexdigest()
+
+
+def _extract(args):
+    # Runs in a worker process: PyPDF2 parsing is CPU bound, so processes beat threads here.
+    # Going through the text cache also warms it for extract_pdf_text on the request path.
+    corpus_dir, rel_path = args
+    file_path = os.path.join(corpus_dir, rel_path)
+    try:
+        cache = get_default_cache()
+        # One hash per file: the store key and the text cache key are the same digest
+        digest = cache.digest(file_path)
+        pages = cache.get_pages(file_path, digest)
+        return rel_path, digest, pages, None
+    except Exception as e:
+        return rel_path, None, None, str(e)
+
+
+def _rows_by_path(table):
+    rows = {}
+    for row in table.to_pylist():
+        rows.setdefault(row["path"], []).append(row)
+    return rows
+
+
+def ingest(corpus_dir=DEFAULT_CORPUS_DIR, store_path=DEFAULT_STORE_PATH, workers=None):
+    """Extracts every PDF of the corpus into a Parquet store of page texts.
+
+    Files whose size and mtime (or content hash) match the existing store are
+    kept as they are, so re-running only parses new or changed labels.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    start = time.time()
+    existing = {}
+    if os.path.exists(store_path):
+        existing = _rows_by_path(pq.read_table(store_path))
+
+    rows, todo = [], []
+    for rel_path in find_pdfs(corpus_dir):
+        stat = os.stat(os.path.join(corpus_dir, rel_path))
+        old_rows = existing.get(rel_path)
+        if old_rows and (old_rows[0]["size"], old_rows[0]["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+            rows.extend(old_rows)
+        else:
+            todo.append(rel_path)
+
+    changed, failed = 0, []
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for rel_path, digest, pages, error in pool.map(_extract, [(corpus_dir, p) for p in todo]):
+                if error:
+                    print(f"Error reading PDF file {rel_path}: {error}")
+                    failed.append(rel_path)
+                    continue
+                stat = os.stat(os.path.join(corpus_dir, rel_path))
+                old_rows = existing.get(rel_path)
+                if not (old_rows and old_rows[0]["sha256"] == digest):
+                    changed += 1
+                label_id = os.path.splitext(os.path.basename(rel_path))[0]
+                category = os.path.dirname(rel_path).replace(os.sep, '/')
+                for i, text in enumerate(pages):
+                    rows.append({"label_id": label_id, "category": category, "path": rel_path,
+                                 "sha256": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                                 "page": i, "text": text})
+
+    table = pa.Table.from_pylist(rows, schema=store_schema())
+    tmp_path = f"{store_path}.tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, store_path)
+    labels = len({row["path"] for row in rows})
+    print(f"Ingested {labels} labels ({len(rows)} pages) into {store_path}: "
+          f"{changed} new or changed, {len(failed)} failed, {time.time() - start:.1f}s")
+    return table
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Extract the label corpus into a Parquet page store.")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS_DIR, help="directory walked for PDFs")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="output Parquet file")
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes (default: all cores)")
+    args = parser.parse_args()
+    ingest(args.corpus, args.store, args.workers)
@@ -0,0 +1,294 @@
+import argparse, hashlib, json, os, socket, sqlite3, threading, time, uuid
+from collections import namedtuple
+from tracing import span
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DEFAULT_QUEUE_PATH = os.path.join(ROOT_DIR, 'data', 'jobs.sqlite')
+
+Job = namedtuple("Job", ["id", "kind", "payload", "status", "result", "error", "attempts", "created", "started",
+                         "finished", "worker"])
+# queued -> running -> done | failed; a failed attempt goes back to queued until max_attempts
+ACTIVE = ("queued", "running")
+
+
+def job_key(kind, payload):
+    """Identical requests (same kind, whitespace-normalised payload) share a key, and so a job."""
+    normalised = {k: " ".join(v.split()) if isinstance(v, str) else v for k, v in payload.items()}
+    return hashlib.sha256(json.dumps([kind, normalised], sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def classify_text(payload):
+    from cascade import get_cascade
+    decision = get_cascade().classify(payload["text"], payload.get("topic", "DILI"), payload.get("ae_text", False))
+    return decision._asdict()
+
+
+def classify_drug(payload):
+    """Finds the drug's label, splits out its adverse event sections and classifies them."""
+    from drugIndex import get_drug_index
+    from pdfCache import get_default_cache
+    from sectionSplitter import split_AE_sections
+    path = get_drug_index().lookup(payload["drug"])
+    if path is None:
+        raise LookupError(get_drug_index().not_found_message(payload["drug"]))
+    text = get_default_cache().get_AE_text(path)
+    sections = split_AE_sections(text)
+    result = classify_text({"text": " ".join(sections) if sections else text, "topic": payload.get("topic", "DILI"),
+                            "ae_text": True})
+    return dict(result, path=path, sections=len(sections))
+
+
+HANDLERS = {"text": classify_text, "drug": classify_drug}
+PERMANENT_ERRORS = (LookupError, ValueError, TypeError)
+
+
+class JobQueue:
+    """Classification jobs in a SQLite table, shared by the front end and any number of workers.
+
+    submit() returns the id of an identical queued, running or finished job
+    instead of adding a new one, so a burst of the same request costs one
+    classification. Workers claim jobs in a write transaction, so no two
+    claim the same job, even from different processes.
+    """
+
+    def __init__(self, path=None, max_attempts=3, lease=600):
+        self.path = path or os.environ.get("JOB_QUEUE_PATH", DEFAULT_QUEUE_PATH)
+        self.max_attempts = max_attempts
+        self.lease = lease  # seconds before a running job whose worker died is handed out again
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        # Autocommit, transactions are opened explicitly where a read and a write must be atomic
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, key TEXT NOT NULL, kind TEXT NOT NULL, "
+                           "payload TEXT NOT NULL, status TEXT NOT NULL, result TEXT, error TEXT, "
+                           "attempts INTEGER NOT NULL DEFAULT 0, created REAL NOT NULL, started REAL, "
+                           "finished REAL, worker TEXT)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, status)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def submit(self, kind, payload, reuse_done=True):
+        """Queues a job unless an identical one is in flight (or done, with reuse_done), returns the job id."""
+        if kind not in HANDLERS:
+            raise ValueError(f"Unknown job kind {kind!r}, expected one of {sorted(HANDLERS)}")
+        key = job_key(kind, payload)
+        statuses = ACTIVE + ("done",) if reuse_done else ACTIVE
+
+        def submit(conn):
+            row = conn.execute(f"SELECT id FROM jobs WHERE key = ? AND status IN ({','.join('?' * len(statuses))}) "
+                               "ORDER BY created DESC LIMIT 1", (key, *statuses)).fetchone()
+            if row:
+                return row[0]
+            job_id = uuid.uuid4().hex
+            conn.execute("INSERT INTO jobs (id, key, kind, payload, status, created) VALUES (?, ?, ?, ?, 'queued', ?)",
+                         (job_id, key, kind, json.dumps(payload), time.time()))
+            return job_id
+        return self._transaction(submit)
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT id, kind, payload, status, result, error, attempts, created, started, "
+                                     "finished, worker FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return Job(row[0], row[1], json.loads(row[2]), row[3], json.loads(row[4]) if row[4] else None, *row[5:])
+
+    def wait(self, job_id, timeout=None, poll_interval=0.5):
+        """Polls until the job is done or failed (or timeout seconds pass), returns the last Job seen."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            job = self.get(job_id)
+            if job is None or job.status not in ACTIVE:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            time.sleep(poll_interval)
+
+    def position(self, job_id):
+        """Jobs queued ahead of this one, 0 once it is running or finished."""
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created < "
+                                     "(SELECT created FROM jobs WHERE id = ? AND status = 'queued')",
+                                     (job_id,)).fetchone()
+        return row[0] if row else 0
+
+    def claim(self, worker):
+        """Marks the oldest queued job (or a running one whose lease ran out) as running for worker.
+
+        A job whose lease ran out after its last attempt is marked failed
+        instead: its worker died on it every time (a crash never reaches fail()).
+        """
+        def claim(conn):
+            now = time.time()
+            conn.execute("UPDATE jobs SET status = 'failed', finished = ?, "
+                         "error = 'Worker lost: the lease expired on the last attempt' "
+                         "WHERE status = 'running' AND started < ? AND attempts >= ?",
+                         (now, now - self.lease, self.max_attempts))
+            row = conn.execute("SELECT id FROM jobs WHERE status = 'queued' OR (status = 'running' AND started < ? "
+                               "AND attempts < ?) ORDER BY created LIMIT 1",
+                               (now - self.lease, self.max_attempts)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', started = ?, worker = ?, attempts = attempts + 1 "
+                         "WHERE id = ?", (now, worker, row[0]))
+            return row[0]
+        job_id = self._transaction(claim)
+        return self.get(job_id) if job_id else None
+
+    def complete(self, job_id, worker, result):
+        """Records the result of worker's attempt, returns False when the job is no longer worker's to finish.
+
+        That happens when its lease ran out and the job was claimed again (or
+        finished) by another worker, whose attempt then stands.
+        """
+        with self._lock:
+            return self._conn.execute("UPDATE jobs SET status = 'done', result = ?, error = NULL, finished = ? "
+                                      "WHERE id = ? AND worker = ? AND status = 'running'",
+                                      (json.dumps(result, default=str), time.time(), job_id, worker)).rowcount > 0
+
+    def fail(self, job_id, worker, error, retry=True):
+        """Records a failed attempt, the job is queued again (with retry) until it has had max_attempts.
+
+        Like complete(), only while the job is still running for worker; returns whether it was recorded.
+        """
+        def fail(conn):
+            row = conn.execute("SELECT attempts FROM jobs WHERE id = ? AND worker = ? AND status = 'running'",
+                               (job_id, worker)).fetchone()
+            if row is None:
+                return False
+            status = "queued" if retry and row[0] < self.max_attempts else "failed"
+            conn.execute("UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?",
+                         (status, str(error)[:2000], time.time() if status == "failed" else None, job_id))
+            return True
+        return self._transaction(fail)
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(dict.fromkeys(ACTIVE + ("done", "failed"), 0), **dict(rows))
+
+
+class WorkerPool:
+    """Threads that claim and run jobs from a JobQueue until stopped.
+
+    The number of workers bounds how many classifications run at once; the
+    API request rate across all of them is bounded by the LLMClient's rate
+    limiter (LLM_REQUESTS_PER_MINUTE).
+    """
+
+    def __init__(self, queue, workers=4, poll_interval=0.5, handlers=None):
+        self.queue = queue
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.handlers = handlers or HANDLERS
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._threads = []
+
+    def run_one(self, worker):
+        """Claims and runs one job, returns False when the queue is empty."""
+        job = self.queue.claim(worker)
+        if job is None:
+            return False
+        with span("job.run", **{"job.id": job.id, "job.kind": job.kind, "job.attempt": job.attempts}):
+            try:
+                result = self.handlers[job.kind](job.payload)
+            except Exception as e:
+                print(f"Job {job.id} ({job.kind}) failed on attempt {job.attempts}: {e}")
+                # A missing label or a bad payload fails the same way every time
+                recorded = self.queue.fail(job.id, worker, e, retry=not isinstance(e, PERMANENT_ERRORS))
+            else:
+                recorded = self.queue.complete(job.id, worker, result)
+            if not recorded:
+                print(f"Job {job.id}: lease lost on attempt {job.attempts}, its outcome is dropped")
+        return True
+
+    def _loop(self, worker):
+        while not self._stop.is_set():
+            try:
+                busy = self.run_one(worker)
+            except sqlite3.Error as e:
+                print(f"{worker}: job queue error: {e}")
+                busy = False
+            if not busy:
+                self._stop.wait(self.poll_interval)
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._loop, args=(f"{self.name}/{i}",), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+_default_queue = None
+
+def get_job_queue():
+    """Returns the process-wide JobQueue on JOB_QUEUE_PATH (default data/jobs.sqlite)."""
+    global _default_queue
+    if _default_queue is None:
+        _default_queue = JobQueue()
+    return _default_queue
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local job queue for DILI classification requests.")
+    parser.add_argument("--queue", default=None, help="SQLite file, default JOB_QUEUE_PATH or data/jobs.sqlite")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="run workers until interrupted")
+    serve.add_argument("--workers", type=int, default=4)
+    submit = commands.add_parser("submit", help="queue a job and wait for its result")
+    submit.add_argument("--text")
+    submit.add_argument("--drug")
+    submit.add_argument("--topic", default="DILI")
+    submit.add_argument("--fresh", action="store_true", help="do not reuse the result of an identical finished job")
+    submit.add_argument("--no-wait", action="store_true")
+    status = commands.add_parser("status", help="show a job")
+    status.add_argument("job_id")
+    commands.add_parser("stats", help="count jobs by status")
+    args = parser.parse_args()
+
+    queue = JobQueue(args.queue)
+    if args.command == "serve":
+        pool = WorkerPool(queue, args.workers).start()
+        print(f"{args.workers} workers on {queue.path}, Ctrl-C to stop")
+        try:
+            while True:
+                time.sleep(10)
+                print(queue.stats())
+        except KeyboardInterrupt:
+            pool.stop()
+    elif args.command == "submit":
+        if bool(args.text) == bool(args.drug):
+            parser.error("submit needs exactly one of --text or --drug")
+        kind, payload = ("text", {"text": args.text}) if args.text else ("drug", {"drug": args.drug})
+        job_id = queue.submit(kind, dict(payload, topic=args.topic), reuse_done=not args.fresh)
+        print(job_id)
+        if not args.no_wait:
+            print(queue.wait(job_id))
+    elif args.command == "status":
+        print(queue.get(args.job_id))
+    else:
+        print(queue.stats())
@@ -0,0 +1,126 @@
+import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_CHUNK_TOKENS = 8000
+DEFAULT_OVERLAP_TOKENS = 200
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+_SECTION_RE = re.compile(r"^\s*#S\d+\s*\[(?P<name>[^\]]+)\]:\[(?P<content>.*)\]\s*$", re.DOTALL)
+_NO_DILI = "No DILI information was found."
+
+_default_encoding = None
+
+
+def get_encoding():
+    """The tiktoken encoding of gpt-4o / gpt-4o-mini, or False when tiktoken cannot be loaded.
+
+    Loaded on first use: tiktoken downloads the encoding once (then reads
+    it from its cache), so without it or a network the count is approximated.
+    """
+    global _default_encoding
+    if _default_encoding is None:
+        try:
+            import tiktoken
+            _default_encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            print(f"tiktoken unavailable, approximating token counts: {e}")
+            _default_encoding = False
+    return _default_encoding
+
+
+def count_tokens(text):
+    """Counts tokens locally with tiktoken, or approximates one token per word or punctuation mark."""
+    encoding = get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(_WORD_RE.findall(text))
+
+
+def chunk_text(text, max_tokens=DEFAULT_CHUNK_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS):
+    """Splits text into windows of at most max_tokens, cut at line boundaries.
+
+    Consecutive windows share about overlap_tokens of text, so a sentence cut
+    by a window boundary is seen whole by one of them. Returns a list of
+    (start, end) character offsets.
+    """
+    lines = []  # (start, end, tokens)
+    for m in re.finditer(r"[^\n]*\n|[^\n]+$", text):
+        start, end = m.span()
+        tokens = count_tokens(m.group(0))
+        if tokens > max_tokens:
+            # A single line over budget (no line breaks in the extraction) is cut at word boundaries
+            piece_start, budget = start, 0
+            for word in _WORD_RE.finditer(text, start, end):
+                word_tokens = count_tokens(word.group(0))
+                if budget + word_tokens > max_tokens and word.start() > piece_start:
+                    lines.append((piece_start, word.start(), budget))
+                    piece_start, budget = word.start(), 0
+                budget += word_tokens
+            lines.append((piece_start, end, budget))
+        else:
+            lines.append((start, end, tokens))
+
+    windows = []
+    i = 0
+    while i < len(lines):
+        j, budget = i, 0
+        while j < len(lines) and budget + lines[j][2] <= max_tokens:
+            budget += lines[j][2]
+            j += 1
+        j = max(j, i + 1)
+        windows.append((lines[i][0], lines[j - 1][1]))
+        if j >= len(lines):
+            break
+        # Step back over the last lines of this window to start the next one
+        k, overlap = j, 0
+        while k - 1 > i and overlap + lines[k - 1][2] <= overlap_tokens:
+            k -= 1
+            overlap += lines[k][2]
+        i = k
+    return windows
+
+
+def map_chunks(text, fn, max_tokens=DEFAULT_CHUNK_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS, max_workers=4,
+               executor=None):
+    """Calls fn(window_text) for every window in parallel, returns the results in document order.
+
+    Pass an executor to run the windows on an existing pool instead of a new one.
+    """
+    windows = chunk_text(text, max_tokens, overlap_tokens)
+    if len(windows) == 1:
+        return [fn(text[windows[0][0]:windows[0][1]])]
+    if executor is not None:
+        return list(executor.map(lambda w: fn(text[w[0]:w[1]]), windows))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(lambda w: fn(text[w[0]:w[1]]), windows))
+
+
+def _sentences(content):
+    return [s.strip() for s in re.split(r"(?<=[.!?])\s+", content) if s.strip()]
+
+
+def merge_sections(section_lists):
+    """Merges '#S1 [name]:[content]' lists from several windows into one.
+
+    Sections are grouped by name in order of first appearance, sentences
+    repeated by overlapping windows are kept once, and "No DILI information
+    was found." is dropped when another window found content for that section.
+    """
+    merged = OrderedDict()
+    for sections in section_lists:
+        if isinstance(sections, str):
+            continue  # an error message from a failed window
+        for section in sections:
+            m = _SECTION_RE.match(section)
+            if not m:
+                continue
+            sentences = merged.setdefault(m.group("name").strip(), [])
+            for sentence in _sentences(m.group("content")):
+                if sentence not in sentences:
+                    sentences.append(sentence)
+    result = []
+    for i, (name, sentences) in enumerate(merged.items(), 1):
+        found = [s for s in sentences if s != _NO_DILI]
+        result.append(f"#S{i} [{name}]:[{' '.join(found) if found else _NO_DILI}]")
+    return result
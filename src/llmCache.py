@@ -0,0 +1,178 @@
+import hashlib, json, os, sqlite3, threading, time
+from collections import OrderedDict
+from tracing import generator_span, span
+
+# Parameters that change how a call is made but not what it returns
+IGNORED_PARAMS = {"timeout", "stream"}
+
+
+def normalise_text(text):
+    """Collapses whitespace so re-extracted or re-indented prompts map to the same key."""
+    return " ".join(str(text).split())
+
+
+def cache_key(model, messages, params):
+    payload = {
+        "model": model,
+        "messages": [{"role": m["role"], "content": normalise_text(m["content"])} for m in messages],
+        "params": {k: v for k, v in sorted(params.items()) if k not in IGNORED_PARAMS},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class MemoryBackend:
+    """In-process LRU of cached responses."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SQLiteBackend:
+    """On-disk cache of responses, shared between runs and processes."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS responses "
+                           "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, created REAL NOT NULL)")
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at < time.time():
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            return json.loads(value)
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                               (key, json.dumps(value), expires_at, time.time()))
+            self._conn.commit()
+
+
+class LLMCache:
+    """Caches chat completions keyed on (model, normalised messages, parameters).
+
+    Only deterministic calls (temperature=0) are served from the cache, the
+    others always go to the API.
+    """
+
+    def __init__(self, backend=None, ttl=None):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl  # seconds, None keeps entries until evicted
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def complete(self, create, model, messages, **params):
+        """Returns the message content of create(model=..., messages=..., **params), cached when deterministic."""
+        with span("llm.complete", **{"gen_ai.request.model": model}) as s:
+            return self._complete(s, create, model, messages, **params)
+
+    def _complete(self, s, create, model, messages, **params):
+        if params.get("temperature", 1) != 0:
+            response = create(model=model, messages=messages, **params)
+            return response.choices[0].message.content
+        key = cache_key(model, messages, params)
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        s.set(**{"llm.cache.hit": value is not None})
+        if value is not None:
+            return value["content"]
+        response = create(model=model, messages=messages, **params)
+        usage = response.usage.model_dump() if getattr(response, "usage", None) else None
+        value = {"content": response.choices[0].message.content, "model": model, "usage": usage}
+        self.backend.set(key, value, time.time() + self.ttl if self.ttl else None)
+        return value["content"]
+
+    def stream(self, create_stream, model, messages, **params):
+        """Like complete, for create_stream(model=..., messages=..., **params) yielding text deltas.
+
+        A cached response is yielded in one piece, a fresh one is passed
+        through as it arrives and stored once complete.
+        """
+        with generator_span("llm.complete", **{"gen_ai.request.model": model, "llm.stream": True}) as s:
+            yield from self._stream(s, create_stream, model, messages, **params)
+
+    def _stream(self, s, create_stream, model, messages, **params):
+        if params.get("temperature", 1) != 0:
+            yield from create_stream(model=model, messages=messages, **params)
+            return
+        key = cache_key(model, messages, params)
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        s.set(**{"llm.cache.hit": value is not None})
+        if value is not None:
+            yield value["content"]
+            return
+        parts = []
+        for delta in create_stream(model=model, messages=messages, **params):
+            parts.append(delta)
+            yield delta
+        value = {"content": "".join(parts), "model": model, "usage": None}
+        self.backend.set(key, value, time.time() + self.ttl if self.ttl else None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else None}
+
+
+def build_cache_from_env():
+    """Builds the cache from LLM_CACHE_BACKEND (memory, sqlite or off), LLM_CACHE_PATH and LLM_CACHE_TTL."""
+    backend = os.environ.get("LLM_CACHE_BACKEND", "memory").lower()
+    ttl = float(os.environ["LLM_CACHE_TTL"]) if os.environ.get("LLM_CACHE_TTL") else None
+    if backend == "off":
+        return LLMCache(MemoryBackend(max_entries=0), ttl)
+    if backend == "sqlite":
+        path = os.environ.get("LLM_CACHE_PATH",
+                              os.path.join(os.path.expanduser('~'), '.cache', 'hc-collabathon', 'llm_cache.sqlite'))
+        return LLMCache(SQLiteBackend(path), ttl)
+    return LLMCache(MemoryBackend(), ttl)
+
+
+_default_cache = None
+
+def get_llm_cache():
+    """Returns the process-wide LLMCache, created on first use."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = build_cache_from_env()
+    return _default_cache
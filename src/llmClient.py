@@ -0,0 +1,280 @@
+import asyncio, importlib.util, os, random, sqlite3, threading, time, weakref
+import httpx
+import openai
+from openai import AsyncOpenAI, OpenAI
+import config
+from tracing import generator_span, record_usage, span
+
+# Errors worth another attempt: throttling, dropped connections and server side failures
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError,
+                    openai.InternalServerError)
+
+
+class RateLimiter:
+    """Token bucket shared by every thread of the process: `rate` requests per second, bursts up to `burst`.
+
+    reserve() books the next free slot and returns how long to wait for it,
+    so sync and async callers can both sleep on it.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate) - 1
+            self.updated = now
+            # Negative tokens are slots already booked by other callers
+            return max(0.0, -self.tokens / self.rate)
+
+
+class SharedRateLimiter(RateLimiter):
+    """RateLimiter whose bucket lives in a SQLite file, so every process using the file shares one limit.
+
+    Each reserve() is one short write transaction; the clock is wall time,
+    which all processes of a machine agree on.
+    """
+
+    def __init__(self, path, rate, burst=None):
+        super().__init__(rate, burst)
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS bucket (id INTEGER PRIMARY KEY CHECK (id = 0), "
+                           "tokens REAL NOT NULL, updated REAL NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO bucket VALUES (0, ?, ?)", (self.capacity, time.time()))
+
+    def reserve(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                tokens, updated = self._conn.execute("SELECT tokens, updated FROM bucket WHERE id = 0").fetchone()
+                now = time.time()
+                tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate) - 1
+                self._conn.execute("UPDATE bucket SET tokens = ?, updated = ? WHERE id = 0", (tokens, now))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return max(0.0, -tokens / self.rate)
+
+
+class LLMClient:
+    """Single backend for every agent: pooled HTTP connections and retries with jittered backoff.
+
+    Holds one keep-alive connection pool (HTTP/2 when the h2 package is
+    installed) for the OpenAI API and one Ollama client, with sync and
+    async call paths. Retries honour the server's Retry-After header and
+    otherwise back off exponentially with full jitter, so concurrent
+    callers hitting a 429 do not retry in lockstep. With requests_per_minute
+    (or LLM_REQUESTS_PER_MINUTE) every OpenAI request, retries included,
+    first waits for a slot of one RateLimiter shared by all callers. With
+    rate_limit_path (or LLM_RATE_LIMIT_PATH) the limit is a SharedRateLimiter
+    on that file, shared with every other process using it.
+    """
+
+    def __init__(self, max_connections=20, max_retries=5, base_delay=0.5, max_delay=20.0, timeout=60.0,
+                 ollama_host=None, requests_per_minute=None, rate_limit_path=None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.http2 = importlib.util.find_spec("h2") is not None
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                   keepalive_expiry=60)
+        self.http_client = httpx.Client(http2=self.http2, limits=self.limits, timeout=timeout)
+        # Retries are done here, not by the SDK, so they are not multiplied
+        self.openai = OpenAI(http_client=self.http_client, max_retries=0)
+        self.ollama_host = ollama_host or os.environ.get("OLLAMA_HOST")
+        self._ollama = None
+        self._async_openai = weakref.WeakKeyDictionary()  # one per event loop, pools are bound to their loop
+        self._lock = threading.Lock()
+        requests_per_minute = requests_per_minute or float(os.environ.get("LLM_REQUESTS_PER_MINUTE") or 0)
+        rate_limit_path = rate_limit_path or os.environ.get("LLM_RATE_LIMIT_PATH")
+        if not requests_per_minute:
+            self.rate_limiter = None
+        elif rate_limit_path:
+            self.rate_limiter = SharedRateLimiter(rate_limit_path, requests_per_minute / 60)
+        else:
+            self.rate_limiter = RateLimiter(requests_per_minute / 60)
+
+    def throttle(self, s=None):
+        """Seconds to wait for the next rate limit slot (0 without a limit), recorded on span s."""
+        delay = self.rate_limiter.reserve() if self.rate_limiter else 0.0
+        if delay and s is not None:
+            s.set(**{"llm.rate_limit_wait": s.attributes.get("llm.rate_limit_wait", 0.0) + delay})
+        return delay
+
+    def swarm_client(self):
+        """The pooled OpenAI client for libraries that call it directly (Swarm), using the SDK's own retries.
+
+        Its chat.completions.create calls are traced like chat().
+        """
+        return _TracedClient(self.openai.with_options(max_retries=self.max_retries), self)
+
+    def backoff(self, attempt, error=None):
+        """Seconds to wait before retry number `attempt` (0-based)."""
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_delay)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def chat(self, model, messages, **params):
+        """chat.completions.create with retries, returns the ChatCompletion."""
+        with span("llm.chat", **{"gen_ai.system": "openai", "gen_ai.request.model": model}) as s:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    time.sleep(self.throttle(s))
+                    response = self.openai.chat.completions.create(model=model, messages=messages, **params)
+                    s.set(**{"llm.retries": attempt})
+                    record_usage(s, response.usage)
+                    return response
+                except RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self.backoff(attempt, e)
+                    print(f"OpenAI call failed ({type(e).__name__}), retry {attempt + 1} in {delay:.1f}s")
+                    time.sleep(delay)
+
+    def parse(self, model, messages, response_format, **params):
+        """Structured output (beta.chat.completions.parse into a pydantic model) with retries."""
+        with span("llm.parse", **{"gen_ai.system": "openai", "gen_ai.request.model": model,
+                                  "llm.response_format": response_format.__name__}) as s:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    time.sleep(self.throttle(s))
+                    response = self.openai.beta.chat.completions.parse(model=model, messages=messages,
+                                                                       response_format=response_format, **params)
+                    s.set(**{"llm.retries": attempt})
+                    record_usage(s, response.usage)
+                    return response
+                except RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self.backoff(attempt, e)
+                    print(f"OpenAI call failed ({type(e).__name__}), retry {attempt + 1} in {delay:.1f}s")
+                    time.sleep(delay)
+
+    def chat_stream(self, model, messages, **params):
+        """Streaming chat.completions.create, yields the content deltas as they arrive.
+
+        Only a failure before the first delta is retried, so no text is yielded twice.
+        """
+        with generator_span("llm.chat_stream", **{"gen_ai.system": "openai", "gen_ai.request.model": model}) as s:
+            for attempt in range(self.max_retries + 1):
+                started = False
+                try:
+                    time.sleep(self.throttle(s))
+                    for chunk in self.openai.chat.completions.create(model=model, messages=messages, stream=True,
+                                                                     **params):
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            if not started:
+                                s.set(**{"llm.time_to_first_token": s.duration})
+                            started = True
+                            yield delta
+                    s.set(**{"llm.retries": attempt})
+                    return
+                except RETRYABLE_ERRORS as e:
+                    if started or attempt == self.max_retries:
+                        raise
+                    delay = self.backoff(attempt, e)
+                    print(f"OpenAI call failed ({type(e).__name__}), retry {attempt + 1} in {delay:.1f}s")
+                    time.sleep(delay)
+
+    def async_openai(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_openai.get(loop)
+            if client is None:
+                http_client = httpx.AsyncClient(http2=self.http2, limits=self.limits, timeout=self.timeout)
+                client = AsyncOpenAI(http_client=http_client, max_retries=0)
+                self._async_openai[loop] = client
+        return client
+
+    async def achat(self, model, messages, **params):
+        """Async chat.completions.create with retries, returns the ChatCompletion."""
+        client = self.async_openai()
+        with span("llm.chat", **{"gen_ai.system": "openai", "gen_ai.request.model": model}) as s:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    await asyncio.sleep(self.throttle(s))
+                    response = await client.chat.completions.create(model=model, messages=messages, **params)
+                    s.set(**{"llm.retries": attempt})
+                    record_usage(s, response.usage)
+                    return response
+                except RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self.backoff(attempt, e)
+                    print(f"OpenAI call failed ({type(e).__name__}), retry {attempt + 1} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+
+    def ollama_chat(self, model, messages, **params):
+        """ollama chat on a persistent client with retries, returns the ollama response."""
+        import ollama  # only needed for the local models
+        with self._lock:
+            if self._ollama is None:
+                self._ollama = ollama.Client(host=self.ollama_host, timeout=self.timeout)
+        with span("llm.chat", **{"gen_ai.system": "ollama", "gen_ai.request.model": model}) as s:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = self._ollama.chat(model=model, messages=messages, **params)
+                    s.set(**{"llm.retries": attempt, "gen_ai.usage.input_tokens": response.get("prompt_eval_count"),
+                             "gen_ai.usage.output_tokens": response.get("eval_count")})
+                    return response
+                except (ollama.ResponseError, httpx.TransportError) as e:
+                    status = getattr(e, "status_code", None)
+                    if attempt == self.max_retries or (status is not None and status < 500 and status != 429):
+                        raise
+                    delay = self.backoff(attempt, e)
+                    print(f"Ollama call failed ({type(e).__name__}), retry {attempt + 1} in {delay:.1f}s")
+                    time.sleep(delay)
+
+    def close(self):
+        self.http_client.close()
+
+
+class _TracedClient:
+    """Stands in for an OpenAI client where only chat.completions.create is used (Swarm)."""
+
+    def __init__(self, client, owner):
+        self.client = client
+        self.owner = owner  # the LLMClient, for its rate limiter
+        self.chat = self
+        self.completions = self
+
+    def create(self, model, messages, **params):
+        with span("llm.chat", **{"gen_ai.system": "openai", "gen_ai.request.model": model,
+                                 "llm.stream": bool(params.get("stream")),
+                                 "llm.tools": len(params.get("tools") or [])}) as s:
+            time.sleep(self.owner.throttle(s))
+            response = self.client.chat.completions.create(model=model, messages=messages, **params)
+            record_usage(s, getattr(response, "usage", None))
+            return response
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+def get_client():
+    """Returns the process-wide LLMClient, created on first use."""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            config.init()  # API key and endpoints from env.txt / .env
+            _default_client = LLMClient()
+    return _default_client
@@ -0,0 +1,222 @@
+import argparse, hashlib, json, random, re, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Canned answers, picked by what the system prompt asks for
+_SECTIONS_ANSWER = ("#S1 [Warnings and Precautions]:[Cases of hepatotoxicity, including liver failure, were reported.]\n"
+                    "#S2 [Adverse Reactions]:[Increased ALT and AST, jaundice.]")
+_KEYWORDS_ANSWER = "- hepatotoxicity\n- liver failure\n- increased ALT\n- jaundice"
+_HEPATIC_RE = re.compile(r"hepat|liver|jaundice|bilirubin|\bALT\b|\bAST\b|DILI", re.IGNORECASE)
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def _schema_instance(schema, relevant):
+    """A minimal valid instance of a JSON schema, choosing the enum value by `relevant`."""
+    if "enum" in schema:
+        values = schema["enum"]
+        return values[0] if relevant or len(values) == 1 else values[1]
+    if "anyOf" in schema:
+        return _schema_instance(schema["anyOf"][0], relevant)
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: _schema_instance(prop, relevant) for name, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [_schema_instance(schema.get("items", {}), relevant)]
+    if kind == "number":
+        return 0.9
+    if kind == "integer":
+        return 1
+    if kind == "boolean":
+        return relevant
+    return "Mock rationale."
+
+
+def reply_for(messages, response_format=None):
+    """Deterministic answer for a chat request: structured output, section extraction, keywords or a vote."""
+    system = " ".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+    user = " ".join(m.get("content") or "" for m in messages if m.get("role") == "user")
+    relevant = bool(_HEPATIC_RE.search(user))
+    if response_format and response_format.get("type") == "json_schema":
+        return json.dumps(_schema_instance(response_format["json_schema"]["schema"], relevant))
+    if "#S1" in system:
+        return _SECTIONS_ANSWER
+    if "keywords" in system.lower():
+        return _KEYWORDS_ANSWER
+    if "json" in system.lower():
+        return json.dumps({"classification": "Relevant" if relevant else "Not Relevant", "confidence": 0.9,
+                           "rationale": "Mock rationale."})
+    return "Relevant" if relevant else "Not Relevant"
+
+
+class MockLLMServer:
+    """Local stand-in for the OpenAI and Ollama HTTP APIs, with configurable speed.
+
+    Serves /v1/chat/completions (plain, streamed and structured output),
+    /v1/embeddings and Ollama's /api/chat. Each response takes `latency`
+    seconds plus one token per 1/`tokens_per_second` seconds, and a share
+    `error_rate` of requests is answered with 429 and Retry-After, so the
+    pipeline's concurrency and retries can be measured without an API key.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.2, tokens_per_second=200.0, error_rate=0.0,
+                 embedding_dim=256, seed=0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.embedding_dim = embedding_dim
+        self.random = random.Random(seed)
+        self.calls = {}  # path -> requests served
+        self.tokens = {}  # path -> prompt and completion tokens served
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def total_tokens(self):
+        with self._lock:
+            return sum(self.tokens.values())
+
+    def _count_tokens(self, path, tokens):
+        with self._lock:
+            self.tokens[path] = self.tokens.get(path, 0) + tokens
+
+    def _count(self, path):
+        with self._lock:
+            self.calls[path] = self.calls.get(path, 0) + 1
+            return self.random.random() < self.error_rate
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, body, headers=()):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in headers:
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                path = self.path.split("?")[0]
+                if server._count(path):
+                    time.sleep(server.latency / 2)
+                    return self._send_json(429, {"error": {"message": "Rate limit (mock)", "type": "rate_limit"}},
+                                           [("Retry-After", "0.1")])
+                if path.endswith("/chat/completions"):
+                    return self.chat_completions(body)
+                if path.endswith("/embeddings"):
+                    return self.embeddings(body)
+                if path == "/api/chat":
+                    return self.ollama_chat(body)
+                self._send_json(404, {"error": {"message": f"Unknown path {path}"}})
+
+            def chat_completions(self, body):
+                messages = body.get("messages", [])
+                content = reply_for(messages, body.get("response_format"))
+                prompt_tokens = sum(estimate_tokens(m.get("content") or "") for m in messages)
+                completion_tokens = estimate_tokens(content)
+                server._count_tokens(self.path.split("?")[0], prompt_tokens + completion_tokens)
+                base = {"id": "chatcmpl-mock", "created": int(time.time()), "model": body.get("model", "mock"),
+                        "system_fingerprint": "mock"}
+                time.sleep(server.latency)
+                if not body.get("stream"):
+                    time.sleep(completion_tokens / server.tokens_per_second)
+                    return self._send_json(200, dict(base, object="chat.completion", choices=[
+                        {"index": 0, "finish_reason": "stop", "logprobs": None,
+                         "message": {"role": "assistant", "content": content}}],
+                        usage={"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                               "total_tokens": prompt_tokens + completion_tokens}))
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                for piece in re.findall(r"\S+\s*|\s+", content):
+                    time.sleep(estimate_tokens(piece) / server.tokens_per_second)
+                    chunk = dict(base, object="chat.completion.chunk", choices=[
+                        {"index": 0, "finish_reason": None, "delta": {"role": "assistant", "content": piece}}])
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                done = dict(base, object="chat.completion.chunk",
+                            choices=[{"index": 0, "finish_reason": "stop", "delta": {}}])
+                self.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode())
+
+            def embeddings(self, body):
+                inputs = body.get("input", [])
+                inputs = [inputs] if isinstance(inputs, str) else inputs
+                data = []
+                for i, text in enumerate(inputs):
+                    # Seeded by the text, so the same passage always gets the same vector
+                    rng = random.Random(hashlib.sha256(str(text).encode()).digest())
+                    data.append({"object": "embedding", "index": i,
+                                 "embedding": [rng.gauss(0, 1) for _ in range(server.embedding_dim)]})
+                tokens = sum(estimate_tokens(str(text)) for text in inputs)
+                server._count_tokens(self.path.split("?")[0], tokens)
+                time.sleep(server.latency)
+                self._send_json(200, {"object": "list", "data": data, "model": body.get("model", "mock"),
+                                      "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+            def ollama_chat(self, body):
+                messages = body.get("messages", [])
+                if body.get("format") == "json":
+                    messages = messages + [{"role": "system", "content": "json"}]
+                content = reply_for(messages)
+                server._count_tokens(self.path.split("?")[0], sum(estimate_tokens(m.get("content") or "")
+                                                                  for m in messages) + estimate_tokens(content))
+                time.sleep(server.latency + estimate_tokens(content) / server.tokens_per_second)
+                self._send_json(200, {"model": body.get("model", "mock"), "created_at": "1970-01-01T00:00:00Z",
+                                      "message": {"role": "assistant", "content": content}, "done": True,
+                                      "done_reason": "stop",
+                                      "prompt_eval_count": sum(estimate_tokens(m.get("content") or "")
+                                                               for m in messages),
+                                      "eval_count": estimate_tokens(content)})
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a mock OpenAI/Ollama server for local benchmarks.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 429")
+    args = parser.parse_args()
+    server = MockLLMServer(port=args.port, latency=args.latency, tokens_per_second=args.tokens_per_second,
+                           error_rate=args.error_rate)
+    print(f"Mock LLM server on {server.url} (OPENAI_BASE_URL={server.url}/v1, OLLAMA_HOST={server.url})")
+    server.httpd.serve_forever()
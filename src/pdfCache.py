@@ -0,0 +1,228 @@
+import hashlib, json, os, shutil, threading, time
+from collections import OrderedDict
+import PyPDF2
+from sectionSplitter import SPLITTER_VERSION, outline_page_ranges, sections_complete
+
+# Bump the suffix whenever the way pages are extracted changes, so old entries are ignored
+EXTRACTOR_VERSION = f"PyPDF2-{PyPDF2.__version__}-1"
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'hc-collabathon', 'pdf_text')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_DIGESTS = 4096
+
+
+def file_digest(file_path, chunk_size=1 << 20):
+    """Returns the sha256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_pdf_pages(file_path):
+    """Parses a PDF with PyPDF2 and returns the text of every page."""
+    with open(file_path, "rb") as pdf_file:
+        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        return [page.extract_text() or "" for page in pdf_reader.pages]
+
+
+def iter_pdf_pages(file_path, page_numbers=None):
+    """Yields (page number, text) one page at a time, only parsing the pages asked for.
+
+    Stop iterating to stop parsing; the file is closed when the generator is.
+    """
+    with open(file_path, "rb") as pdf_file:
+        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        for i in (range(len(pdf_reader.pages)) if page_numbers is None else page_numbers):
+            yield i, pdf_reader.pages[i].extract_text() or ""
+
+
+def _flatten_outline(pdf_reader, outline, depth=0):
+    for item in outline:
+        if isinstance(item, list):
+            yield from _flatten_outline(pdf_reader, item, depth + 1)
+        else:
+            page = pdf_reader.get_destination_page_number(item)
+            if page is not None and page >= 0:
+                yield depth, item.title or "", page
+
+
+def outline_AE_pages(file_path):
+    """Page numbers of the Warnings and Adverse Reactions sections according to the PDF
+    outline, or None when the outline does not locate both."""
+    with open(file_path, "rb") as pdf_file:
+        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        try:
+            entries = list(_flatten_outline(pdf_reader, pdf_reader.outline))
+        except Exception:
+            return None  # broken or missing outline
+        ranges = outline_page_ranges(entries, len(pdf_reader.pages))
+    if len(ranges) < 2:
+        return None
+    return sorted({page for first, last in ranges.values() for page in range(first, last + 1)})
+
+
+def read_AE_pages(file_path):
+    """Extracts only the pages holding the adverse event sections.
+
+    Uses the outline to go straight to them when it has both sections,
+    otherwise reads page by page and stops once both sections are complete.
+    Returns the page texts in order.
+    """
+    page_numbers = outline_AE_pages(file_path)
+    if page_numbers is not None:
+        return [text for _, text in iter_pdf_pages(file_path, page_numbers)]
+    pages = []
+    for _, text in iter_pdf_pages(file_path):
+        pages.append(text)
+        if sections_complete("".join(pages)):
+            break
+    return pages
+
+
+class PdfTextCache:
+    """On-disk cache of extracted PDF text, one entry per file content hash.
+
+    Each entry is a directory holding one text file per page plus a meta.json.
+    Entries are keyed by the sha256 of the PDF bytes and the extractor version,
+    so a changed PDF (or a new extractor) simply misses and is re-parsed.
+    The total size is bounded by evicting the least recently used entries.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None, extractor_version=EXTRACTOR_VERSION,
+                 max_digests=DEFAULT_MAX_DIGESTS):
+        self.cache_dir = cache_dir or os.environ.get('PDF_TEXT_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.max_bytes = int(max_bytes or os.environ.get('PDF_TEXT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        self.extractor_version = extractor_version
+        # path -> ((size, mtime), content digest), saves re-hashing unchanged files. One entry per
+        # path, least recently used first, at most max_digests of them.
+        self.max_digests = max_digests
+        self._digests = OrderedDict()
+        self._digests_lock = threading.Lock()
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def digest(self, file_path):
+        stat = os.stat(file_path)
+        path, version = os.path.abspath(file_path), (stat.st_size, stat.st_mtime_ns)
+        with self._digests_lock:
+            entry = self._digests.get(path)
+            if entry is not None and entry[0] == version:
+                self._digests.move_to_end(path)
+                return entry[1]
+        digest = file_digest(file_path)
+        with self._digests_lock:
+            self._digests[path] = (version, digest)
+            self._digests.move_to_end(path)
+            while len(self._digests) > self.max_digests:
+                self._digests.popitem(last=False)
+        return digest
+
+    def key(self, digest):
+        version = hashlib.sha256(self.extractor_version.encode()).hexdigest()[:12]
+        return f"{digest}-{version}"
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, digest):
+        """Returns the cached pages for a content digest, or None on a miss."""
+        entry_dir = self._entry_dir(self.key(digest))
+        meta_path = os.path.join(entry_dir, 'meta.json')
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            pages = []
+            for i in range(meta['pages']):
+                with open(os.path.join(entry_dir, f'page_{i:05d}.txt'), 'r', encoding='utf-8') as f:
+                    pages.append(f.read())
+        except (FileNotFoundError, KeyError, ValueError):
+            return None
+        # Touch the entry so eviction treats it as recently used
+        os.utime(meta_path, None)
+        return pages
+
+    def put(self, digest, pages, source=None):
+        """Stores the pages of a PDF under its content digest."""
+        key = self.key(digest)
+        entry_dir = self._entry_dir(key)
+        tmp_dir = f"{entry_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+        size = 0
+        for i, page in enumerate(pages):
+            data = page.encode('utf-8')
+            size += len(data)
+            with open(os.path.join(tmp_dir, f'page_{i:05d}.txt'), 'wb') as f:
+                f.write(data)
+        meta = {"pages": len(pages), "bytes": size, "source": source,
+                "extractor": self.extractor_version, "created": time.time()}
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        try:
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            # Another worker stored the same content first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict()
+
+    def get_pages(self, file_path, digest=None):
+        """Returns the page texts of a PDF, parsing it only on a cache miss.
+
+        Pass the content digest when the caller has already computed it.
+        """
+        digest = digest or self.digest(file_path)
+        pages = self.get(digest)
+        if pages is None:
+            pages = read_pdf_pages(file_path)
+            self.put(digest, pages, source=os.path.abspath(file_path))
+        return pages
+
+    def get_text(self, file_path):
+        return "".join(self.get_pages(file_path))
+
+    def get_AE_text(self, file_path):
+        """Text of the pages holding the adverse event sections, from the full entry when cached.
+
+        The partial extraction is cached under its own key, which includes
+        the splitter version since the splitter chooses the pages.
+        """
+        digest = self.digest(file_path)
+        pages = self.get(digest)
+        if pages is None:
+            ae_digest = f"{digest}-ae{SPLITTER_VERSION}"
+            pages = self.get(ae_digest)
+            if pages is None:
+                pages = read_AE_pages(file_path)
+                self.put(ae_digest, pages, source=os.path.abspath(file_path))
+        return "".join(pages)
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits in max_bytes."""
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                meta_path = os.path.join(self.cache_dir, name, 'meta.json')
+                try:
+                    with open(meta_path, 'r') as f:
+                        size = json.load(f).get('bytes', 0)
+                    entries.append((os.path.getmtime(meta_path), size, name))
+                except (FileNotFoundError, NotADirectoryError, ValueError):
+                    continue
+                total += size
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(self._entry_dir(name), ignore_errors=True)
+                total -= size
+
+
+_default_cache = None
+
+def get_default_cache():
+    """Returns the process-wide PdfTextCache, created on first use."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = PdfTextCache()
+    return _default_cache
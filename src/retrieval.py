@@ -0,0 +1,214 @@
+import argparse, json, math, os, re, time
+from collections import Counter
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from ingest import DEFAULT_CORPUS_DIR, DEFAULT_STORE_PATH, labels_fingerprint, load_labels
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DEFAULT_INDEX_DIR = os.path.join(ROOT_DIR, 'data', 'retrieval_index')
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Added to every DILI query so passages about liver injury rank first
+HEPATOTOXICITY_TERMS = ("hepatotoxicity liver injury hepatic failure hepatitis jaundice cholestasis "
+                        "ALT AST alkaline phosphatase bilirubin transaminases")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def split_passages(page_text, min_words=80, max_words=250):
+    """Cuts a page into passages of roughly paragraph size."""
+    passages, current = [], []
+    for paragraph in re.split(r"\n\s*\n", page_text):
+        words = paragraph.split()
+        while len(words) > max_words:
+            passages.append(" ".join(current + words[:max_words - len(current)]))
+            words = words[max_words - len(current):]
+            current = []
+        current += words
+        if len(current) >= min_words:
+            passages.append(" ".join(current))
+            current = []
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+class RetrievalIndex:
+    """BM25 inverted index over label passages, with optional dense vectors.
+
+    Postings are kept as flat NumPy arrays (CSR layout: term -> slice of doc
+    ids and term frequencies) so a query is scored with a handful of
+    vectorised operations. Embeddings, when built, are a normalised float32
+    matrix memory-mapped from disk and searched with one matrix-vector product.
+    """
+
+    def __init__(self, passages, vocab, offsets, doc_ids, tfs, doc_lens, embeddings=None, k1=1.5, b=0.75,
+                 fingerprint=None):
+        self.passages = passages  # list of {"path", "page", "text"}
+        self.fingerprint = fingerprint  # ingest.labels_fingerprint() of the labels it was built from
+        self.vocab = vocab        # term -> row into offsets
+        self.offsets, self.doc_ids, self.tfs, self.doc_lens = offsets, doc_ids, tfs, doc_lens
+        self.embeddings = embeddings
+        self.k1, self.b = k1, b
+        self.avg_len = float(doc_lens.mean()) if len(doc_lens) else 0.0
+        self.paths = np.array([p["path"] for p in passages])
+
+    @classmethod
+    def build(cls, store_path=DEFAULT_STORE_PATH, embed=False, corpus_dir=DEFAULT_CORPUS_DIR):
+        """Indexes every passage of every label in the ingested page store, or of the corpus PDFs without one."""
+        fingerprint = labels_fingerprint(corpus_dir, store_path)
+        passages = []
+        for path, pages in sorted(load_labels(corpus_dir, store_path).items()):
+            for page, page_text in enumerate(pages):
+                for text in split_passages(page_text):
+                    passages.append({"path": path, "page": page, "text": text})
+
+        postings = {}
+        doc_lens = np.zeros(len(passages), dtype=np.float32)
+        for doc_id, passage in enumerate(passages):
+            counts = Counter(tokenize(passage["text"]))
+            doc_lens[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc_id, tf))
+        vocab, offsets, doc_ids, tfs = {}, [0], [], []
+        for row, (term, entries) in enumerate(sorted(postings.items())):
+            vocab[term] = row
+            doc_ids += [d for d, _ in entries]
+            tfs += [tf for _, tf in entries]
+            offsets.append(len(doc_ids))
+        embeddings = embed_texts([p["text"] for p in passages]) if embed else None
+        return cls(passages, vocab, np.array(offsets, dtype=np.int64), np.array(doc_ids, dtype=np.int32),
+                   np.array(tfs, dtype=np.float32), doc_lens, embeddings, fingerprint=fingerprint)
+
+    def save(self, index_dir=DEFAULT_INDEX_DIR):
+        os.makedirs(index_dir, exist_ok=True)
+        pq.write_table(pa.Table.from_pylist(self.passages), os.path.join(index_dir, "passages.parquet"),
+                       compression="zstd")
+        with open(os.path.join(index_dir, "vocab.json"), "w") as f:
+            json.dump(self.vocab, f)
+        np.savez(os.path.join(index_dir, "bm25.npz"), offsets=self.offsets, doc_ids=self.doc_ids,
+                 tfs=self.tfs, doc_lens=self.doc_lens)
+        embeddings_path = os.path.join(index_dir, "embeddings.npy")
+        if self.embeddings is not None:
+            np.save(embeddings_path, np.asarray(self.embeddings))
+        elif os.path.exists(embeddings_path):
+            # Vectors of an earlier build no longer match the passages
+            os.remove(embeddings_path)
+        with open(os.path.join(index_dir, "source.json"), "w") as f:
+            json.dump({"fingerprint": self.fingerprint}, f)
+
+    @classmethod
+    def load(cls, index_dir=DEFAULT_INDEX_DIR):
+        passages = pq.read_table(os.path.join(index_dir, "passages.parquet")).to_pylist()
+        with open(os.path.join(index_dir, "vocab.json"), "r") as f:
+            vocab = json.load(f)
+        arrays = np.load(os.path.join(index_dir, "bm25.npz"))
+        embeddings_path = os.path.join(index_dir, "embeddings.npy")
+        # Memory-mapped, so only the rows touched by a search are paged in
+        embeddings = np.load(embeddings_path, mmap_mode="r") if os.path.exists(embeddings_path) else None
+        source_path = os.path.join(index_dir, "source.json")
+        fingerprint = None
+        if os.path.exists(source_path):
+            with open(source_path, "r") as f:
+                fingerprint = json.load(f).get("fingerprint")
+        return cls(passages, vocab, arrays["offsets"], arrays["doc_ids"], arrays["tfs"], arrays["doc_lens"],
+                   embeddings, fingerprint=fingerprint)
+
+    def bm25_scores(self, query):
+        scores = np.zeros(len(self.passages), dtype=np.float32)
+        n = len(self.passages)
+        for term in set(tokenize(query)):
+            row = self.vocab.get(term)
+            if row is None:
+                continue
+            start, end = self.offsets[row], self.offsets[row + 1]
+            docs, tf = self.doc_ids[start:end], self.tfs[start:end]
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lens[docs] / self.avg_len)
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query, k=8, paths=None, dense=True):
+        """Returns the top-k passages as dicts with path, page, text and score.
+
+        With embeddings, BM25 and dense rankings are combined by reciprocal
+        rank fusion. `paths` restricts the search to some labels.
+        """
+        scores = self.bm25_scores(query)
+        if dense and self.embeddings is not None:
+            query_vector = embed_texts([query])[0]
+            dense_scores = np.asarray(self.embeddings @ query_vector, dtype=np.float32)
+            scores = _rank_fusion(scores) + _rank_fusion(dense_scores)
+        if paths is not None:
+            scores = np.where(np.isin(self.paths, list(paths)), scores, -np.inf)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k] if k else []
+        top = sorted(top, key=lambda i: -scores[i])
+        return [dict(self.passages[i], score=float(scores[i])) for i in top if scores[i] > 0]
+
+
+def _rank_fusion(scores, k=60):
+    ranks = np.empty(len(scores), dtype=np.float32)
+    ranks[np.argsort(-scores)] = np.arange(1, len(scores) + 1)
+    return 1.0 / (k + ranks)
+
+
+def embed_texts(texts, batch_size=256):
+    """Embeds texts with the OpenAI embeddings API, returns L2-normalised float32 rows."""
+    from llmClient import get_client
+    client = get_client()
+    vectors = []
+    for i in range(0, len(texts), batch_size):
+        response = client.openai.embeddings.create(model=EMBEDDING_MODEL, input=texts[i:i + batch_size])
+        vectors += [item.embedding for item in response.data]
+    matrix = np.array(vectors, dtype=np.float32)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+_default_index = None
+
+def get_retrieval_index(index_dir=DEFAULT_INDEX_DIR):
+    """Returns the process-wide RetrievalIndex, building it (BM25 only) from the page store or PDFs if missing.
+
+    A saved index is rebuilt when the labels of the corpus (or the ingested
+    store) have changed since it was built.
+    """
+    global _default_index
+    if _default_index is None:
+        if os.path.exists(os.path.join(index_dir, "bm25.npz")):
+            _default_index = RetrievalIndex.load(index_dir)
+            if _default_index.fingerprint != labels_fingerprint():
+                print("Labels changed since the retrieval index was built, rebuilding it")
+                _default_index = None
+        if _default_index is None:
+            _default_index = RetrievalIndex.build()
+            _default_index.save(index_dir)
+    return _default_index
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build or query the passage retrieval index.")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="ingested page store, the PDFs of "
+                                                                  "--corpus are read when there is none")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS_DIR)
+    parser.add_argument("--index", default=DEFAULT_INDEX_DIR)
+    parser.add_argument("--embed", action="store_true", help="also compute dense vectors (OpenAI embeddings)")
+    parser.add_argument("--query", help="search the existing index instead of building it")
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+    if args.query:
+        index = RetrievalIndex.load(args.index)
+        start = time.perf_counter()
+        results = index.search(args.query, k=args.k)
+        print(f"{len(results)} passages in {(time.perf_counter() - start) * 1000:.1f} ms")
+        for r in results:
+            print(f"[{r['score']:.3f}] {r['path']} p.{r['page'] + 1}: {r['text'][:200]}")
+    else:
+        index = RetrievalIndex.build(args.store, embed=args.embed, corpus_dir=args.corpus)
+        index.save(args.index)
+        print(f"Indexed {len(index.passages)} passages, {len(index.vocab)} terms into {args.index}")
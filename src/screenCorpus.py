@@ -0,0 +1,189 @@
+import argparse, csv, glob, json, multiprocessing, os, time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from ingest import DEFAULT_CORPUS_DIR, find_pdfs
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DEFAULT_OUTPUT_DIR = os.path.join(ROOT_DIR, 'data', 'screening')
+REPORT_COLUMNS = ["path", "category", "sha256", "sections", "lexicon_hits", "severe_terms", "label", "confidence",
+                  "tier", "source", "local_seconds", "llm_seconds", "error"]
+
+
+def shard_paths(corpus_dir, paths, shards):
+    """Splits the labels into shards of about equal total file size, largest files first."""
+    shards = max(1, min(shards, len(paths)))
+    sizes = sorted(((os.path.getsize(os.path.join(corpus_dir, p)), p) for p in paths), reverse=True)
+    loads, assigned = [0] * shards, [[] for _ in range(shards)]
+    for size, path in sizes:
+        i = loads.index(min(loads))
+        loads[i] += size
+        assigned[i].append(path)
+    return [sorted(shard) for shard in assigned]
+
+
+def screen_local(corpus_dir, rel_path):
+    """The CPU-bound stages of one label: adverse event pages, sections by heading, lexicon scan and tier.
+
+    Only a label without any liver term is decided here (Not Relevant, the
+    cascade's keyword rule); severe terms can also be warnings about other
+    drugs or populations, so every other label goes to the LLM stages.
+    """
+    from hepatoLexicon import get_lexicon
+    from pdfCache import get_default_cache
+    from sectionSplitter import split_AE_sections
+    start = time.perf_counter()
+    file_path = os.path.join(corpus_dir, rel_path)
+    cache = get_default_cache()
+    text = cache.get_AE_text(file_path)
+    hits = get_lexicon().scan(text)
+    label = None if hits else "Not Relevant"
+    return {
+        "path": rel_path,
+        "category": os.path.dirname(rel_path).replace(os.sep, '/'),
+        "sha256": cache.digest(file_path),
+        "sections": len(split_AE_sections(text) or []),
+        "lexicon_hits": len(hits),
+        "severe_terms": ";".join(sorted(get_lexicon().severe(hits))),
+        "label": label,
+        "confidence": None,
+        "tier": "lexicon" if label else None,
+        "source": "lexicon" if label else None,
+        "local_seconds": round(time.perf_counter() - start, 3),
+        "llm_seconds": None,
+        "error": None,
+    }
+
+
+def screen_llm(corpus_dir, row):
+    """The LLM stages of one label, answered from the evidence store when it is up to date there."""
+    from evidenceStore import compute_evidence, get_evidence_store
+    start = time.perf_counter()
+    file_path = os.path.join(corpus_dir, row["path"])
+    store = get_evidence_store()
+    evidence = store.get(row["sha256"])
+    if evidence is not None:
+        label, confidence, tier, source = evidence.label, evidence.confidence, evidence.tier, "store"
+    else:
+        sections, keywords, decision = compute_evidence(file_path)
+        store.put(file_path, sections, keywords, decision, digest=row["sha256"])
+        label, confidence, tier, source = decision.label, decision.confidence, decision.tier, "computed"
+    return dict(row, label=label, confidence=confidence, tier=tier, source=source,
+                llm_seconds=round(time.perf_counter() - start, 3))
+
+
+def _init_worker(environ):
+    # Runs first in every worker process. The settings of the parent (rate limit file, cache paths) are
+    # applied before any client or cache exists, so each process builds its own from them.
+    os.environ.update(environ)
+    import config
+    config.init()
+
+
+def screen_shard(index, corpus_dir, rel_paths, output_dir, use_llm=True, threads=4):
+    """Screens one shard in this process and writes its rows to shard-NNN.jsonl, returns the row count.
+
+    The local stages run one label after the other, they are CPU bound and
+    the processes are the parallelism. Labels the lexicon cannot decide go
+    to a thread pool for the LLM stages, whose API requests are paced by the
+    rate limit all processes share.
+    """
+    shard_path = os.path.join(output_dir, f"shard-{index:03d}.jsonl")
+    with open(shard_path, "w") as out, ThreadPoolExecutor(max_workers=threads) as pool:
+        def write(row):
+            out.write(json.dumps(row) + "\n")
+            out.flush()
+
+        pending = []
+        for rel_path in rel_paths:
+            try:
+                row = screen_local(corpus_dir, rel_path)
+            except Exception as e:
+                write({"path": rel_path, "error": f"Error reading PDF file: {e}"})
+                continue
+            if row["label"] or not use_llm:
+                write(row)
+            else:
+                pending.append((row, pool.submit(screen_llm, corpus_dir, row)))
+        for row, future in pending:
+            try:
+                write(future.result())
+            except Exception as e:
+                write(dict(row, error=str(e)))
+    return len(rel_paths)
+
+
+def merge_reports(output_dir, report_path=None):
+    """Merges the shard files of output_dir into one CSV report sorted by path, returns the rows."""
+    rows = []
+    for shard_path in sorted(glob.glob(os.path.join(output_dir, "shard-*.jsonl"))):
+        with open(shard_path) as f:
+            rows.extend(json.loads(line) for line in f if line.strip())
+    rows.sort(key=lambda row: row["path"])
+    report_path = report_path or os.path.join(output_dir, "report.csv")
+    with open(report_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+
+def summarise(rows):
+    """Counts of each label per category (the dili / non_dili folders) and the error count."""
+    by_category = {}
+    for row in rows:
+        by_category.setdefault(row.get("category") or "", Counter())[row.get("label") or "Undecided"] += 1
+    return {"labels": len(rows), "errors": sum(1 for row in rows if row.get("error")),
+            "by_category": {category: dict(counts) for category, counts in sorted(by_category.items())}}
+
+
+def screen_corpus(corpus_dir=None, output_dir=None, processes=None, threads=4, use_llm=True,
+                  requests_per_minute=None):
+    """Screens every label of the corpus on worker processes and merges their shards into one report.
+
+    Each process holds its own API client, LLM response cache and evidence
+    store connection; the PDF text cache and the evidence store are files
+    they share. With requests_per_minute the API rate limit is one
+    SharedRateLimiter for all processes.
+    """
+    corpus_dir = corpus_dir or DEFAULT_CORPUS_DIR
+    output_dir = output_dir or DEFAULT_OUTPUT_DIR
+    processes = processes or os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+    for shard_path in glob.glob(os.path.join(output_dir, "shard-*.jsonl")):
+        os.remove(shard_path)
+    environ = {}
+    if requests_per_minute:
+        environ["LLM_REQUESTS_PER_MINUTE"] = str(requests_per_minute)
+    if requests_per_minute or os.environ.get("LLM_REQUESTS_PER_MINUTE"):
+        environ["LLM_RATE_LIMIT_PATH"] = os.environ.get("LLM_RATE_LIMIT_PATH",
+                                                        os.path.join(output_dir, "ratelimit.sqlite"))
+
+    start = time.time()
+    shards = shard_paths(corpus_dir, find_pdfs(corpus_dir), processes)
+    print(f"Screening {sum(map(len, shards))} labels in {len(shards)} shards")
+    # Fresh interpreters, not forks, so no client, connection or lock of this process is inherited
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=len(shards), mp_context=context, initializer=_init_worker,
+                             initargs=(environ,)) as pool:
+        futures = [pool.submit(screen_shard, i, corpus_dir, shard, output_dir, use_llm, threads)
+                   for i, shard in enumerate(shards)]
+        for i, future in enumerate(futures):
+            print(f"Shard {i}: {future.result()} labels")
+    rows = merge_reports(output_dir)
+    summary = dict(summarise(rows), processes=len(shards), seconds=round(time.time() - start, 2))
+    print(json.dumps(summary, indent=2))
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Screen every label of the corpus for DILI on worker processes.")
+    parser.add_argument("--corpus", default=None, help="default data/hc")
+    parser.add_argument("--output", default=None, help="shard files and report.csv, default data/screening")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--threads", type=int, default=4, help="LLM stage threads per process")
+    parser.add_argument("--local-only", action="store_true", help="only the extraction and lexicon stages")
+    parser.add_argument("--requests-per-minute", type=float, default=None,
+                        help="API request limit shared by all processes (default LLM_REQUESTS_PER_MINUTE)")
+    args = parser.parse_args()
+    screen_corpus(args.corpus, args.output, args.processes, args.threads, not args.local_only,
+                  args.requests_per_minute)
@@ -0,0 +1,143 @@
+import re
+from collections import namedtuple
+
+Section = namedtuple("Section", ["name", "start", "end", "text"])
+
+# Bump whenever the heading patterns, the outline page ranges or the completeness test change:
+# cached adverse event pages (pdfCache.get_AE_text) and stored evidence are keyed by it
+SPLITTER_VERSION = 1
+
+
+def _words(*words):
+    # PyPDF2 sometimes breaks words apart ("PRECAUTI ONS"), so allow a space between letters
+    return r"\s+".join(" ?".join(re.escape(c) for c in word) for word in words)
+
+
+# Sections sent downstream for DILI review, with the heading as printed in the monograph.
+# Older monographs have separate WARNINGS and PRECAUTIONS headings, the former covers both.
+TARGET_SECTIONS = {
+    "Warnings and Precautions": _words("WARNINGS") + r"(?:\s+" + _words("AND", "PRECAUTIONS") + r")?",
+    "Adverse Reactions": _words("ADVERSE") + r"\s+(?:" + _words("DRUG") + r"\s+)?" + _words("REACTIONS"),
+}
+
+# Top-level headings of Canadian product monographs, both the current numbered
+# template (e.g. "7 WARNINGS AND PRECAUTIONS") and the older unnumbered one.
+# Any of them ends the section before it.
+TOP_LEVEL_HEADINGS = [
+    r"TABLE\s+OF\s+CONTENTS",
+    r"RECENT\s+MAJOR\s+LABEL(?:LING)?\s+CHANGES",
+    r"PART\s+I{1,3}\s*:.*",
+    r"SUMMARY\s+PRODUCT\s+INFORMATION",
+    r"INDICATIONS(?:\s+AND\s+CLINICAL\s+USE)?",
+    r"CONTRAINDICATIONS",
+    r"SERIOUS\s+WARNINGS\s+AND\s+PRECAUTIONS\s+BOX",
+    r"DOSAGE\s+AND\s+ADMINISTRATION",
+    r"OVERDOSAGE",
+    r"DOSAGE\s+FORMS,\s+(?:STRENGTHS,\s+)?COMPOSITION\s+AND\s+PACKAGING",
+    r"DRUG\s+INTERACTIONS",
+    r"(?:ACTION\s+AND\s+)?CLINICAL\s+PHARMACOLOGY",
+    r"STORAGE(?:,)?\s+(?:AND\s+)?STABILITY(?:\s+AND\s+DISPOSAL)?",
+    r"SPECIAL\s+HANDLING\s+INSTRUCTIONS",
+    r"PHARMACEUTICAL\s+INFORMATION",
+    r"CLINICAL\s+TRIALS",
+    r"DETAILED\s+PHARMACOLOGY",
+    r"MICROBIOLOGY",
+    r"(?:NON-?\s*CLINICAL\s+)?TOXICOLOGY",
+    r"REFERENCES",
+    r"SUPPORTING\s+PRODUCT\s+MONOGRAPHS",
+    r"PATIENT\s+MEDICATION\s+INFORMATION",
+    r"CONSUMER\s+INFORMATION",
+] + list(TARGET_SECTIONS.values())
+
+# A heading sits alone on its line, optionally numbered ("8", "8." or "8 ") and possibly
+# run into the page footer before it, in upper case and without table of contents leaders.
+_NUMBER = r"^(?:.*?\bPage\s*\d+(?:\s*of\s*\d+)?)?[ \t]*(?:\d{1,2}\.?[ \t]+)?"
+_HEADING_RE = re.compile(_NUMBER + r"(?:" + "|".join(TOP_LEVEL_HEADINGS) + r")[ \t]*$", re.MULTILINE)
+_TARGET_RES = {name: re.compile(_NUMBER + pattern + r"[ \t]*$", re.MULTILINE)
+               for name, pattern in TARGET_SECTIONS.items()}
+
+
+def _is_cross_reference(text, start, end):
+    # e.g. "(see \nWARNINGS AND PRECAUTIONS \n(6), Renal )" wrapped onto its own line
+    before = text[max(0, start - 20):start].rstrip().lower()
+    after = text[end:end + 5].lstrip()
+    return before.endswith(("see", "and", ",", ";", "(")) or after.startswith(("(", ")", ",", ";"))
+
+
+def index_sections(text):
+    """Returns the (start, end) offsets of every top-level heading line in the text."""
+    return [(m.start(), m.end()) for m in _HEADING_RE.finditer(text)]
+
+
+def find_AE_sections(text):
+    """Locates the target sections of a product monograph by their headings.
+
+    A heading can also appear in the table of contents or the patient
+    information part, so for each target the occurrence spanning the most text
+    up to the next top-level heading is kept. Returns a list of Section, which
+    is empty when none of the headings can be found.
+    """
+    headings = index_sections(text)
+    sections = []
+    for name, heading_re in _TARGET_RES.items():
+        best = None
+        for m in heading_re.finditer(text):
+            if _is_cross_reference(text, m.start(), m.end()):
+                continue
+            end = next((start for start, _ in headings if start > m.start()), len(text))
+            if best is None or end - m.end() > best.end - best.start:
+                best = Section(name, m.end(), end, text[m.end():end])
+        if best is not None and best.text.strip():
+            sections.append(best)
+    return sections
+
+
+def _title_matches(title, pattern):
+    # Outline titles carry the section number but no page footer, e.g. "7       WARNINGS AND PRECAUTIONS"
+    return re.fullmatch(r"(?:\d{1,2}(?:\.\d+)*\.?\s+)?(?:" + pattern + r")", title.strip(), re.IGNORECASE) is not None
+
+
+def outline_page_ranges(entries, page_count):
+    """Maps the target sections to page ranges using the PDF outline (bookmarks).
+
+    entries are (depth, title, page) in outline order. A section runs from
+    its bookmark to the next top-level heading bookmark at the same or an
+    outer level, plus one page, as the heading may start halfway down
+    that page and bookmarks often point a page early. Returns {name: (first_page, last_page)}, 0-based and
+    inclusive, for the sections found.
+    """
+    ranges = {}
+    for i, (depth, title, page) in enumerate(entries):
+        for name, pattern in TARGET_SECTIONS.items():
+            if name in ranges or not _title_matches(title, pattern):
+                continue
+            end = page_count - 1
+            for next_depth, next_title, next_page in entries[i + 1:]:
+                if (next_depth <= depth and next_page >= page and
+                        any(_title_matches(next_title, heading) for heading in TOP_LEVEL_HEADINGS)):
+                    end = min(next_page + 1, page_count - 1)
+                    break
+            ranges[name] = (page, end)
+    return ranges
+
+
+def sections_complete(text, min_chars=500):
+    """True once every target section is in the text and closed by a following heading.
+
+    Lets a page-by-page reader stop early. Sections shorter than min_chars
+    are taken for table of contents entries and not counted.
+    """
+    sections = find_AE_sections(text)
+    return (len(sections) == len(TARGET_SECTIONS) and
+            all(section.end < len(text) and len(section.text.strip()) >= min_chars for section in sections))
+
+
+def format_sections(sections):
+    """Formats sections the way get_AE_sections returns them, e.g. '#S1 [Adverse Reactions]:[...]'."""
+    return [f"#S{i} [{section.name}]:[{' '.join(section.text.split())}]"
+            for i, section in enumerate(sections, 1)]
+
+
+def split_AE_sections(text):
+    """Rule-based replacement for the get_AE_sections LLM call, [] when headings are missing."""
+    return format_sections(find_AE_sections(text))
@@ -0,0 +1,208 @@
+import argparse, contextvars, json, os, secrets, threading, time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Spans are written as one JSON object per line, with OpenTelemetry (OTLP/JSON) field names
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed step (agent handoff, tool call, LLM request) with attributes, nested by context."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "status", "events")
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.status = "STATUS_CODE_UNSET"
+        self.events = []
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add_event(self, name, **attributes):
+        """A point in time within the span, e.g. an agent handoff."""
+        self.events.append({"name": name, "timeUnixNano": time.time_ns(), "attributes": attributes})
+
+    @property
+    def duration(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_dict(self):
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "status": {"code": self.status},
+            "events": self.events,
+        }
+
+
+class JsonlSink:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+        with self._lock, open(self.path, "a") as f:
+            f.write(line)
+
+
+class MemorySink:
+    """Keeps finished spans in a list, for benchmarks and interactive use."""
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+_sinks = []
+
+def add_sink(sink):
+    _sinks.append(sink)
+    return sink
+
+def remove_sink(sink):
+    _sinks.remove(sink)
+
+if os.environ.get("TRACE_PATH"):
+    add_sink(JsonlSink(os.environ["TRACE_PATH"]))
+
+
+def current_span():
+    return _current.get()
+
+
+def _record_error(s, e):
+    s.status = "STATUS_CODE_ERROR"
+    s.attributes["exception.type"] = type(e).__name__
+    s.attributes["exception.message"] = str(e)[:500]
+
+
+def _export(s):
+    s.end_ns = time.time_ns()
+    for sink in _sinks:
+        try:
+            sink.export(s)
+        except Exception as e:
+            print(f"Trace export failed: {e}")
+
+
+@contextmanager
+def span(name, **attributes):
+    """Times the block as a child of the current span; exceptions mark it as an error and propagate."""
+    s = Span(name, _current.get(), attributes)
+    token = _current.set(s)
+    try:
+        yield s
+        s.status = "STATUS_CODE_OK"
+    except GeneratorExit:
+        s.status = "STATUS_CODE_OK"
+        raise
+    except BaseException as e:
+        _record_error(s, e)
+        raise
+    finally:
+        _current.reset(token)
+        _export(s)
+
+
+@contextmanager
+def generator_span(name, **attributes):
+    """span() for the body of a generator, timed from the first to the last item.
+
+    Between yields the generator runs in its consumer's context, so this
+    span never becomes the current span there: it would parent the
+    consumer's unrelated spans, and could not be reset when the generator
+    is closed from another context. Closing early is not an error.
+    """
+    s = Span(name, _current.get(), attributes)
+    try:
+        yield s
+        s.status = "STATUS_CODE_OK"
+    except GeneratorExit:
+        s.status = "STATUS_CODE_OK"
+        raise
+    except BaseException as e:
+        _record_error(s, e)
+        raise
+    finally:
+        _export(s)
+
+
+def add_event(name, **attributes):
+    """Records an event on the current span, or as an instant span of its own when there is none."""
+    s = _current.get()
+    if s is not None:
+        s.add_event(name, **attributes)
+        return
+    s = Span(name, None, attributes)
+    s.status = "STATUS_CODE_OK"
+    _export(s)
+
+
+def propagate(fn):
+    """Wraps fn so spans it opens on another thread (thread pools) nest under the caller's current span."""
+    parent = _current.get()
+
+    def run(*args, **kwargs):
+        token = _current.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return run
+
+
+def record_usage(s, usage):
+    """Adds token counts from an OpenAI usage object to a span."""
+    if usage is not None:
+        s.set(**{"gen_ai.usage.input_tokens": usage.prompt_tokens,
+                 "gen_ai.usage.output_tokens": usage.completion_tokens})
+
+
+def summarize(path):
+    """Aggregates a JSONL trace by span name: count, errors, latency and tokens, slowest total first."""
+    groups = defaultdict(lambda: {"count": 0, "errors": 0, "seconds": [], "input_tokens": 0, "output_tokens": 0,
+                                  "cache_hits": 0})
+    with open(path, "r") as f:
+        for line in f:
+            record = json.loads(line)
+            group = groups[record["name"]]
+            attributes = record.get("attributes", {})
+            group["count"] += 1
+            group["errors"] += record.get("status", {}).get("code") == "STATUS_CODE_ERROR"
+            group["seconds"].append((record["endTimeUnixNano"] - record["startTimeUnixNano"]) / 1e9)
+            group["input_tokens"] += attributes.get("gen_ai.usage.input_tokens") or 0
+            group["output_tokens"] += attributes.get("gen_ai.usage.output_tokens") or 0
+            group["cache_hits"] += bool(attributes.get("llm.cache.hit"))
+    report = {}
+    for name, group in sorted(groups.items(), key=lambda item: -sum(item[1]["seconds"])):
+        seconds = sorted(group.pop("seconds"))
+        report[name] = dict(group, total_seconds=sum(seconds), mean_seconds=sum(seconds) / len(seconds),
+                            p95_seconds=seconds[min(len(seconds) - 1, int(len(seconds) * 0.95))])
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Summarize a JSONL trace by span name.")
+    parser.add_argument("path", nargs="?", default=os.environ.get("TRACE_PATH"))
+    args = parser.parse_args()
+    for name, stats in summarize(args.path).items():
+        print(f"{name:40s} n={stats['count']:<5d} total={stats['total_seconds']:8.2f}s "
+              f"mean={stats['mean_seconds']:6.3f}s p95={stats['p95_seconds']:6.3f}s "
+              f"tokens={stats['input_tokens']}/{stats['output_tokens']} cache_hits={stats['cache_hits']} "
+              f"errors={stats['errors']}")
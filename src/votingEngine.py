@@ -0,0 +1,186 @@
+import asyncio, math
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from tracing import propagate
+
+Vote = namedtuple("Vote", ["voter", "label", "weight", "result"])  # label is None for an abstention
+Decision = namedtuple("Decision", ["label", "confidence", "tally", "votes", "quorum_met", "decided_early"])
+
+DEFAULT_ACCURACY = 0.75
+
+
+def accuracy_weight(accuracy, n_labels=2):
+    """Log-odds weight of a voter that picks the right label with probability `accuracy`.
+
+    Summing these weights is the optimal (naive Bayes) way to combine
+    independent voters, and makes the softmax of the tally a posterior.
+    """
+    accuracy = min(max(accuracy, 1e-3), 1 - 1e-3)
+    return math.log((n_labels - 1) * accuracy / (1 - accuracy))
+
+
+def estimate_accuracies(records, label_of=str.strip, prior=(1, 1)):
+    """Per-voter accuracy from labelled records {"expected": label, "votes": {voter: answer}}.
+
+    label_of reads the label from an answer, as in VotingEngine; a missing
+    answer counts as wrong. Uses a Beta prior (Laplace smoothing by default)
+    so voters with few labelled answers stay close to 0.5.
+    """
+    hits, totals = {}, {}
+    for record in records:
+        if record.get("expected") is None:
+            continue
+        for voter, answer in (record.get("votes") or {}).items():
+            totals[voter] = totals.get(voter, 0) + 1
+            label = label_of(answer) if answer is not None else None
+            hits[voter] = hits.get(voter, 0) + (label == record["expected"])
+    return {voter: (hits[voter] + prior[0]) / (totals[voter] + prior[0] + prior[1]) for voter in totals}
+
+
+class VotingEngine:
+    """Weighted majority voting over agent results, with quorum and early stopping.
+
+    Voters are weighted by their log-odds accuracy, so the confidence of a
+    decision is the posterior probability of the winning label. A decision
+    is valid once voters holding `quorum` of the total weight have voted
+    (abstentions and failed calls do not count), and is final as soon as the
+    votes still outstanding cannot change it. `run`/`arun` only issue as
+    many calls as can still matter.
+    """
+
+    def __init__(self, labels, voters, accuracies=None, quorum=0.5, tie_breaker=None, label_of=None):
+        self.labels = list(labels)
+        accuracies = accuracies or {}
+        self.weights = {voter: accuracy_weight(accuracies.get(voter, DEFAULT_ACCURACY), len(self.labels))
+                        for voter in voters}
+        self.total_weight = sum(self.weights.values())
+        self.quorum = quorum
+        self.tie_breaker = tie_breaker
+        self.label_of = label_of or (lambda result: result)
+
+    def estimate_accuracies(self, records, prior=(1, 1)):
+        """estimate_accuracies() reading the answers of the records with this engine's label_of."""
+        return estimate_accuracies(records, self.label_of, prior)
+
+    def vote(self, voter, result):
+        """Turns a voter's result into a Vote, unknown labels count as abstentions."""
+        label = self.label_of(result) if result is not None else None
+        return Vote(voter, label if label in self.labels else None, self.weights[voter], result)
+
+    def tally(self, votes):
+        tally = dict.fromkeys(self.labels, 0.0)
+        for vote in votes:
+            if vote.label is not None:
+                tally[vote.label] += vote.weight
+        return tally
+
+    def _ranked(self, tally):
+        # Highest tally first, the tie breaker wins ties
+        return sorted(self.labels, key=lambda label: (tally[label], label == self.tie_breaker), reverse=True)
+
+    def _quorum_met(self, votes, pending_weight=0.0):
+        cast = sum(vote.weight for vote in votes if vote.label is not None) + pending_weight
+        return cast >= self.quorum * self.total_weight
+
+    def is_decided(self, votes):
+        """True once the remaining voters can no longer change the decision."""
+        remaining = self.total_weight - sum(vote.weight for vote in votes)
+        if remaining <= 1e-9:
+            return True
+        tally = self.tally(votes)
+        leader, runner_up = self._ranked(tally)[:2]
+        margin = tally[leader] - tally[runner_up]
+        if margin > remaining or (margin == remaining and leader == self.tie_breaker):
+            return self._quorum_met(votes)
+        # Nothing left can bring the votes up to the quorum either
+        return not self._quorum_met(votes, remaining)
+
+    def _winner(self, tally):
+        # The leader, or None when it ties with the runner-up and the tie breaker does not settle it
+        leader, runner_up = self._ranked(tally)[:2]
+        if tally[leader] == tally[runner_up] and leader != self.tie_breaker:
+            return None
+        return leader
+
+    def decide(self, votes):
+        """Decision over the votes; no label without a quorum or on a tie without a tie breaker."""
+        votes = list(votes)
+        tally = self.tally(votes)
+        quorum_met = self._quorum_met(votes)
+        label = self._winner(tally) if quorum_met else None
+        # Posterior over labels: softmax of the log-odds tally
+        top = max(tally.values())
+        exp = {l: math.exp(t - top) for l, t in tally.items()}
+        confidence = exp[label] / sum(exp.values()) if label is not None else 0.0
+        decided_early = sum(vote.weight for vote in votes) < self.total_weight - 1e-9
+        return Decision(label, confidence, tally, votes, quorum_met, decided_early)
+
+    def _needs_more(self, votes, pending):
+        # Issue another call only if the votes cast plus those in flight could leave it undecided
+        # even when every pending vote goes to the current leader
+        tally = self.tally(votes)
+        leader = self._ranked(tally)[0]
+        hopeful = votes + [Vote(voter, leader, self.weights[voter], None) for voter in pending]
+        return not self.is_decided(hopeful)
+
+    def iter_run(self, tasks, max_workers=None, eager=False):
+        """Calls tasks {voter: fn()} on a thread pool, yields each Vote as it arrives.
+
+        Stops once the decision is final. With eager=True every call is
+        issued up front (lowest latency), otherwise only the calls that can
+        still change the outcome (fewest calls). A call that raises counts
+        as an abstention.
+        """
+        queue = sorted(tasks, key=lambda voter: -self.weights[voter])
+        votes, pending = [], {}
+        pool = ThreadPoolExecutor(max_workers=max_workers or len(queue) or 1)
+        try:
+            while True:
+                while queue and (eager or not pending or self._needs_more(votes, pending.values())):
+                    voter = queue.pop(0)
+                    pending[pool.submit(propagate(tasks[voter]))] = voter
+                if not pending:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    voter = pending.pop(future)
+                    try:
+                        votes.append(self.vote(voter, future.result()))
+                    except Exception as e:
+                        print(f"{voter} failed, counted as abstention: {e}")
+                        votes.append(Vote(voter, None, self.weights[voter], None))
+                    yield votes[-1]
+                if self.is_decided(votes):
+                    return
+        finally:
+            # Calls still queued are dropped, calls in flight finish in the background
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, tasks, max_workers=None, eager=False):
+        return self.decide(self.iter_run(tasks, max_workers, eager))
+
+    async def arun(self, tasks, eager=False):
+        """Like run, for tasks {voter: async fn()}; calls left when the decision is final are cancelled."""
+        queue = sorted(tasks, key=lambda voter: -self.weights[voter])
+        votes, pending = [], {}
+        try:
+            while True:
+                while queue and (eager or not pending or self._needs_more(votes, pending.values())):
+                    voter = queue.pop(0)
+                    pending[asyncio.ensure_future(tasks[voter]())] = voter
+                if not pending:
+                    break
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    voter = pending.pop(task)
+                    try:
+                        votes.append(self.vote(voter, task.result()))
+                    except Exception as e:
+                        print(f"{voter} failed, counted as abstention: {e}")
+                        votes.append(Vote(voter, None, self.weights[voter], None))
+                if self.is_decided(votes):
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+        return self.decide(votes)
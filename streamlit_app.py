@@ -1,21 +1,83 @@
 import streamlit as st
-import openai
 from swarm import Swarm, Agent
-import os, re
-import PyPDF2
-from src.demo_openai import MixtureOfAgents
-
-# Load environment variables from .env file
-with open('.env', 'r') as env_file:
-    for line in env_file.readlines():
-        key, val = re.split('=', line.strip())
-        os.environ[key] = val
-
-# Define PDF dictionary
-pdf_dict = {
-    'tamoxifen': './data/hc/00064472.pdf',
-    'atorvastatin': './data/hc/00066863.pdf'
-}
+import os, re, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+# Make the modules in src/ importable the same way they import each other
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+import config
+from demo_openai import MixtureOfAgents
+from cascade import Cascade, format_confidence
+from llmCache import get_llm_cache
+from llmClient import get_client
+from drugIndex import get_drug_index
+from evidenceStore import get_evidence_store
+from hepatoLexicon import format_terms, get_lexicon
+from jobQueue import WorkerPool, get_job_queue
+from labelChunker import DEFAULT_CHUNK_TOKENS, count_tokens, map_chunks, merge_sections
+from pdfCache import get_default_cache
+from retrieval import HEPATOTOXICITY_TERMS, get_retrieval_index
+from sectionSplitter import split_AE_sections
+
+# Streamlit re-runs this script on every interaction. Long-lived objects are created once per
+# process in st.cache_resource functions, so a rerun only does the per-query work. The HTTP client,
+# the PDF text cache and the LLM response cache are process-wide singletons of their modules.
+
+@st.cache_resource
+def load_env():
+    # Load environment variables from the .env file, or env.txt when there is none
+    return config.init('.env' if os.path.exists('.env') else None)
+
+@st.cache_resource
+def load_drug_index():
+    # Brand and generic names of every label in data/hc, built from the label text on first run
+    return get_drug_index()
+
+@st.cache_resource
+def load_swarm():
+    return Swarm(client=get_client().swarm_client())
+
+@st.cache_resource
+def load_mixture():
+    return MixtureOfAgents()
+
+@st.cache_resource
+def load_cascade():
+    # Keyword and local model tiers in front of the API agents, hit rates shown in the sidebar
+    return Cascade(load_mixture())
+
+@st.cache_resource
+def load_job_queue():
+    # Classifications from every session share one queue (JOB_QUEUE_PATH) and a fixed pool of workers,
+    # so a burst of users waits in line instead of calling the API all at once. Workers started with
+    # `python src/jobQueue.py serve` on the same queue file help drain it.
+    queue = get_job_queue()
+    WorkerPool(queue, int(os.environ.get("JOB_QUEUE_WORKERS", 4))).start()
+    return queue
+
+def load_evidence(file_path):
+    # Labels precomputed by `python src/evidenceStore.py`, served when their content hash and models still match
+    if not file_path or not st.session_state.get("use_evidence_store", True):
+        return None
+    return get_evidence_store().lookup(file_path)
+
+def wait_for_job(queue, job_id, poll_interval=0.5):
+    """Polls the job, showing its place in the queue, returns it once done or failed."""
+    with st.status("Classification queued") as status:
+        while True:
+            job = queue.get(job_id)
+            if job.status == "queued":
+                status.update(label=f"Classification queued ({queue.position(job_id)} ahead)")
+            elif job.status == "running":
+                status.update(label=f"Classifying (attempt {job.attempts})", state="running")
+            else:
+                status.update(label=f"Classification {job.status}", state="complete" if job.status == "done" else "error")
+                return job
+            time.sleep(poll_interval)
+
+load_env()
+drug_index = load_drug_index()
 
 # Define prompts for various agents
 prompt_main = '''You are a helpful agent to determine which agent to use for the user.
@@ -24,25 +86,53 @@ If the user asked for DICT or cardiotoxicity classification of a drug, use Agent
 Otherwise, use Agent Generic.'''
 
 prompt_DILI = '''Transfer the query to Agent TOI to retrieve the full text from the PDF.
+For questions across several labels, or to check a specific finding, use retrieve_dili_passages
+to get the most relevant liver injury passages instead of whole labels.
 Answer the user question based on the information extracted from.'''
 
 prompt_TOI = f'''Identify the most relevant PDF based on the drug name mentioned by the user, 
-extract the full text, and return it. {str(pdf_dict)}'''
+extract the full text, and return it.'''
+
+# Per-section keyword calls run concurrently, bounded and with a timeout per call
+MAX_CONCURRENCY = 4
+LLM_TIMEOUT = 30
 
 # Define PDF text extraction function
 def extract_pdf_text(file_path):
     try:
-        with open(file_path, "rb") as pdf_file:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            full_text = "".join(page.extract_text() for page in pdf_reader.pages)
-        return full_text
+        return get_default_cache().get_text(file_path)
+    except FileNotFoundError:
+        return "Error: PDF file not found."
+    except Exception as e:
+        return f"Error reading PDF file: {e}"
+
+def extract_AE_text(file_path):
+    try:
+        # Only the Warnings and Adverse Reactions pages, found from the PDF outline or read until complete
+        return get_default_cache().get_AE_text(file_path)
     except FileNotFoundError:
         return "Error: PDF file not found."
     except Exception as e:
         return f"Error reading PDF file: {e}"
 
 
+def script_thread_pool(max_workers=MAX_CONCURRENCY):
+    # Worker threads need the script context to write to the chat
+    ctx = get_script_run_ctx()
+    return ThreadPoolExecutor(max_workers=max_workers,
+                              initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx))
+
+
 def get_AE_sections(text):
+    # Long labels are cut into overlapping token-budgeted windows sent in parallel, then merged
+    if count_tokens(text) <= DEFAULT_CHUNK_TOKENS:
+        return get_AE_sections_window(text)
+    with script_thread_pool() as pool:
+        window_sections = map_chunks(text, get_AE_sections_window, executor=pool)
+    return merge_sections(window_sections) or "Error extracting sections."
+
+
+def get_AE_sections_window(text):
     res=[]
     prompt = f"""
     You are an expert in drug labeling review. 
@@ -54,17 +144,28 @@ def get_AE_sections(text):
     #S2 [Adverse Reactions]:[...content...]
     """
     try:
-        response = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "system", "content": prompt},
-                      {"role": "user", "content": text}
-                     ],
-            max_tokens=2000,
-            temperature=0
-        )
-        section_content = response.choices[0].message.content.strip()
-        with st.chat_message("assistant"):
-            st.write('==DILI related sections in the document===\n', section_content, '\n===End===\n')
+        messages = [{"role": "system", "content": prompt},
+                    {"role": "user", "content": text}
+                   ]
+        # Deterministic (temperature=0) calls are served from the response cache when seen before
+        if st.session_state.get("stream_responses", True):
+            # Tokens are shown as they arrive instead of after the whole extraction
+            with st.chat_message("assistant"):
+                st.write('==DILI related sections in the document===')
+                content = st.write_stream(get_llm_cache().stream(
+                    get_client().chat_stream, model="gpt-4o-mini", messages=messages, max_tokens=2000, temperature=0))
+            section_content = content.strip()
+        else:
+            content = get_llm_cache().complete(
+                get_client().chat,
+                model="gpt-4o-mini",
+                messages=messages,
+                max_tokens=2000,
+                temperature=0
+            )
+            section_content = content.strip()
+            with st.chat_message("assistant"):
+                st.write('==DILI related sections in the document===\n', section_content, '\n===End===\n')
         sections = re.split(r'\n+', section_content)
         return sections
     except Exception as e:
@@ -73,22 +174,32 @@ def get_AE_sections(text):
     return res
     
 
-def find_dili_keywords(name, text):
+def find_dili_keywords(name, text, seed_terms=None):
     prompt = f"""
     You are an expert in drug-induced liver injury (DILI). 
     Please extract all DILI-related keywords from the following text. 
     Provide the keywords as a list, focusing only on terms directly relevant to liver injury.
     """
+    if seed_terms:
+        # Terms the lexicon scan found, so the model confirms them and looks for the rest
+        prompt += f"""
+    A terminology scan already found these terms in the text:
+{seed_terms}
+    Include them and add any other DILI-related terms.
+    """
     try:
-        response = openai.chat.completions.create(
+        # Deterministic (temperature=0) calls are served from the response cache when seen before
+        content = get_llm_cache().complete(
+            get_client().chat,
             model="gpt-4o-mini",
             messages=[{"role": "system", "content": prompt},
                       {"role": "user", "content": text}
                      ],
             max_tokens=150,
-            temperature=0
+            temperature=0,
+            timeout=LLM_TIMEOUT
         )
-        keywords = response.choices[0].message.content.strip()
+        keywords = content.strip()
         with st.chat_message("assistant"):
             st.write(f'==DILI information found in {name} section===\n {keywords} \n===End===\n')
         return keywords
@@ -97,6 +208,47 @@ def find_dili_keywords(name, text):
             st.write(f"Error querying OpenAI API: {e}")
         return "Error extracting keywords."
 
+def retrieve_dili_passages(query, drug_name=""):
+    # Top BM25 passages about liver injury, across all labels or within one drug's label
+    paths = None
+    if drug_name:
+        file_path = drug_index.lookup(drug_name)
+        if file_path is None:
+            return drug_index.not_found_message(drug_name)
+        paths = [os.path.relpath(file_path, drug_index.corpus_dir)]
+    try:
+        passages = get_retrieval_index().search(f"{query} {HEPATOTOXICITY_TERMS}", k=8, paths=paths)
+    except Exception as e:
+        with st.chat_message("assistant"):
+            st.write(f"Error searching the label passages: {e}")
+        return "Error retrieving passages."
+    with st.chat_message("assistant"):
+        st.write(f"Retrieved {len(passages)} passages: " +
+                 ", ".join(f"{p['path']} p.{p['page'] + 1}" for p in passages))
+    if not passages:
+        return "No matching passages found."
+    return "\n\n".join(f"[{p['path']} p.{p['page'] + 1}] {p['text']}" for p in passages)
+
+def run_streaming(client, agent, messages):
+    """Runs the agents with stream=True, writing each agent turn to the chat token by token.
+
+    Tool steps write their own messages between the turns. Returns the final Swarm Response.
+    """
+    response, placeholder, text = None, None, ""
+    for chunk in client.run(agent=agent, messages=messages, stream=True):
+        if "response" in chunk:
+            response = chunk["response"]
+            continue
+        if chunk.get("delim") == "start":
+            placeholder, text = None, ""
+        if chunk.get("content"):
+            if placeholder is None:
+                with st.chat_message("assistant"):
+                    placeholder = st.empty()
+            text += chunk["content"]
+            placeholder.markdown(text)
+    return response
+
 # Define Agent transfer functions
 def transfer_to_agent_DILI():
     with st.chat_message("assistant"):
@@ -117,52 +269,91 @@ def transfer_to_agent_TOI(drug_name):
     with st.chat_message("assistant"):
         st.write("Agent TOI at work ⏳ ")
     
-    file_path = pdf_dict.get(drug_name.lower(), None)
+    # Only exact names and aliases resolve, a close spelling may be another drug and is only suggested
+    file_path = drug_index.lookup(drug_name)
     with st.chat_message("assistant"):
-        st.write(f"I found {file_path} found for drug name '{drug_name}'.")
+        if file_path:
+            st.write(f"I found {file_path} for drug name '{drug_name}'.")
+        else:
+            st.write(drug_index.not_found_message(drug_name))
     
+    evidence = load_evidence(file_path)
+    if evidence is not None:
+        with st.chat_message("assistant"):
+            st.write(f"Using the evidence precomputed for this label ({evidence.label}).")
+        return str(evidence.keywords)
+
     if file_path:
-        full_text = extract_pdf_text(file_path)
-        sections = get_AE_sections(full_text)
-        keyword_pool = {}
+        # Locate the sections by their headings on the adverse event pages, only read the
+        # full text and ask the LLM when none are found
+        sections = split_AE_sections(extract_AE_text(file_path))
+        if sections:
+            with st.chat_message("assistant"):
+                st.write(f"Found {len(sections)} sections by heading: " + ", ".join(s.split(']')[0] + ']' for s in sections))
+        else:
+            sections = get_AE_sections(extract_pdf_text(file_path))
+        if not isinstance(sections, list):
+            # The section extraction failed, its error message is the answer
+            return sections
+        named_sections = []
         for section in sections:
-            name, content = re.split(r'(?<=\]):(?=\[)', section)
-            dili_keywords = find_dili_keywords(name, content)
-            keyword_pool[name] = dili_keywords
+            try:
+                name, content = re.split(r'(?<=\]):(?=\[)', section, maxsplit=1)
+            except ValueError:
+                # A line of the LLM answer that is not "[title]:[content]"
+                continue
+            named_sections.append((name, content))
+        # Sections without any liver term skip the API call, the others get the terms found as a seed
+        hits = get_lexicon().scan_corpus({name: content for name, content in named_sections})
+        keyword_pool = {name: "None" for name, _ in named_sections}
+        with script_thread_pool() as pool:
+            futures = {name: pool.submit(find_dili_keywords, name, content, format_terms(hits[name]))
+                       for name, content in named_sections if hits[name]}
+            keyword_pool.update({name: future.result() for name, future in futures.items()})
+        if len(futures) < len(keyword_pool):
+            with st.chat_message("assistant"):
+                st.write("No liver terms, keyword extraction skipped: " +
+                         ", ".join(name for name in keyword_pool if name not in futures))
         
         with st.chat_message("assistant"):
             st.write(f"\n====Final Reference Used =====\n{str(keyword_pool)}\n=====END======\nFinal Response:\n")
         
         return str(keyword_pool)
     else:
-        return "No relevant PDF found for this drug."
-
-# Define main and sub-agents
-agent_main = Agent(
-    model="gpt-4o-mini",
-    name="Agent Main",
-    instructions=prompt_main,
-    functions=[transfer_to_agent_DILI, transfer_to_agent_DICT, transfer_to_agent_Generic],
-)
-
-agent_b = Agent(
-    model="gpt-4o-mini",
-    name="Agent DILI",
-    instructions=prompt_DILI,
-    functions=[transfer_to_agent_TOI]
-)
-
-agent_c = Agent(
-    model="gpt-4o-mini",
-    name="Agent DICT",
-    instructions="Answer whether the drug mentioned will cause cardiotoxicity.",
-)
-
-agent_d = Agent(
-    model="gpt-4o-mini",
-    name="Agent Generic",
-    instructions="Answer the user's question if it does not fall into any other specific categories.",
-)
+        return drug_index.not_found_message(drug_name)
+
+# Define main and sub-agents, once per process. The tools they call run with the globals of the
+# first script run, so per-run settings are read from st.session_state.
+@st.cache_resource
+def build_agents():
+    agent_main = Agent(
+        model="gpt-4o-mini",
+        name="Agent Main",
+        instructions=prompt_main,
+        functions=[transfer_to_agent_DILI, transfer_to_agent_DICT, transfer_to_agent_Generic],
+    )
+
+    agent_b = Agent(
+        model="gpt-4o-mini",
+        name="Agent DILI",
+        instructions=prompt_DILI,
+        functions=[transfer_to_agent_TOI, retrieve_dili_passages]
+    )
+
+    agent_c = Agent(
+        model="gpt-4o-mini",
+        name="Agent DICT",
+        instructions="Answer whether the drug mentioned will cause cardiotoxicity.",
+    )
+
+    agent_d = Agent(
+        model="gpt-4o-mini",
+        name="Agent Generic",
+        instructions="Answer the user's question if it does not fall into any other specific categories.",
+    )
+    return agent_main, agent_b, agent_c, agent_d
+
+agent_main, agent_b, agent_c, agent_d = build_agents()
 
 # Streamlit App
 st.title("Multi-Agent DILI Detection Prototype")
@@ -175,7 +366,19 @@ with st.expander("See Agent Architecture"):
 user_input = st.chat_input("Enter the name of the drug eg. tamaxophin")
 
 with st.sidebar:
-    st.markdown("Available drugs:\n" + "\n".join(f"- {drug}" for drug in pdf_dict.keys()))
+    st.toggle("Stream responses", value=True, key="stream_responses")
+    st.toggle("Answer known drugs from the evidence store", value=True, key="use_evidence_store",
+              help="Labels precomputed by evidenceStore.py are answered without LLM calls")
+    st.toggle("Use job queue", value=False, key="use_job_queue",
+              help="Classify through the shared job queue, identical requests are answered once")
+    if st.session_state.use_job_queue:
+        with st.expander("Job queue"):
+            st.json(load_job_queue().stats())
+    st.markdown(f"{len({p for paths in drug_index.names.values() for p in paths})} labels indexed.")
+    with st.expander("Cascade tiers"):
+        st.json(load_cascade().stats())
+    with st.expander("Available drugs"):
+        st.markdown("\n".join(f"- {drug}" for drug in sorted(drug_index.names)))
 
 # Process user input from either chat input or button selection
 if user_input:
@@ -187,22 +390,63 @@ if user_input:
     # Add user message
     st.session_state.messages.append({"role": "user", "content": user_input})
 
+    # An input that is exactly a known drug name or alias, with precomputed evidence, is answered straight
+    # from the store without agents or votes. Anything else (a question, a near spelling) goes to the agents.
+    file_path = drug_index.lookup(user_input)
+    evidence = load_evidence(file_path)
+    if evidence is not None:
+        result = (f"\nThe input is {evidence.label} to the topic (precomputed, decided by the {evidence.tier} tier, "
+                  f"{format_confidence(evidence.confidence)}).")
+        with st.chat_message("assistant"):
+            st.write(f"'{user_input}' matched the label {os.path.relpath(file_path, drug_index.corpus_dir)}. "
+                     f"Precomputed DILI evidence:")
+            st.json(evidence.keywords)
+            st.write("Final Response:", result)
+        st.stop()
+
     # Main query execution
-    client = Swarm()
-    response = client.run(
-        agent=agent_main, 
-        messages=[{"role": "user", "content": f"What is the DILI class of {user_input}?"}]
-    )
+    client = load_swarm()
+    messages = [{"role": "user", "content": f"What is the DILI class of {user_input}?"}]
+    if st.session_state.stream_responses:
+        response = run_streaming(client, agent_main, messages)
+    else:
+        response = client.run(agent=agent_main, messages=messages)
 
-    # Display the response in chat UI
-    with st.chat_message("assistant"):
-        st.write(response.messages[-1]["content"])
+        # Display the response in chat UI
+        with st.chat_message("assistant"):
+            st.write(response.messages[-1]["content"])
 
-    # Additional processing and final result
-    input_text = user_input
+    # Additional processing and final result: classify the agents' answer, as in the benchmark workbook
+    input_text = response.messages[-1]["content"] or user_input
     topic = "DILI"
-    environment = MixtureOfAgents()
-    result = environment.conduct_discussion(input_text, topic)
+    environment = load_mixture()
+    cascade = load_cascade()
+    triage = None if st.session_state.use_job_queue else cascade.triage(input_text, topic)
+    if st.session_state.use_job_queue:
+        # The workers run the same cascade; this session only polls for the result
+        queue = load_job_queue()
+        job = wait_for_job(queue, queue.submit("text", {"text": input_text, "topic": topic}))
+        if job.status == "done":
+            result = (f"\nThe input is {job.result['label']} to the topic (decided by the {job.result['tier']} tier, "
+                      f"{format_confidence(job.result['confidence'])}).")
+        else:
+            result = f"\nThe classification failed: {job.error}"
+    elif triage:
+        result = (f"\nThe input is {triage.label} to the topic (decided by the {triage.tier} tier, "
+                  f"{format_confidence(triage.confidence)}).")
+    elif st.session_state.stream_responses:
+        # Each classifier vote is shown as it arrives, voting stops once the majority is settled
+        start = time.perf_counter()
+        results = []
+        with st.chat_message("assistant"):
+            for vote in environment.iter_discussion(input_text, topic):
+                results.append(vote)
+                st.write(f"{vote['agent_name']}: {environment.answer(vote)} ({vote['latency']:.1f}s)")
+        cascade.record("api", True, time.perf_counter() - start)
+        result = environment.majority_vote(results)
+    else:
+        _, results = cascade.escalate(input_text, topic)
+        result = environment.majority_vote(results)
     
     with st.chat_message("assistant"):
         st.write("Final Response:", result)
@@ -0,0 +1,4 @@
+import os, sys
+
+# The modules of src import each other by bare name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
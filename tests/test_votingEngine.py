@@ -0,0 +1,32 @@
+from votingEngine import Vote, VotingEngine
+
+
+def engine(tie_breaker=None):
+    return VotingEngine(["dili", "non_dili"], ["a", "b", "c"], quorum=0.5, tie_breaker=tie_breaker,
+                        label_of=lambda answer: answer.get("classification"))
+
+
+def test_tie_without_tie_breaker_is_no_consensus():
+    voting = engine()
+    # One of three agents gave an unreadable answer, the other two disagree
+    votes = [voting.vote("a", {"classification": "dili"}), voting.vote("b", {"classification": "non_dili"}),
+             Vote("c", None, voting.weights["c"], None)]
+    decision = voting.decide(votes)
+    assert decision.quorum_met
+    assert decision.label is None
+    assert decision.confidence == 0.0
+
+
+def test_tie_breaker_settles_a_tie():
+    voting = engine(tie_breaker="non_dili")
+    votes = [voting.vote("a", {"classification": "dili"}), voting.vote("b", {"classification": "non_dili"})]
+    decision = voting.decide(votes)
+    assert decision.label == "non_dili"
+    assert decision.confidence == 0.5
+
+
+def test_majority_wins():
+    voting = engine()
+    votes = [voting.vote(voter, {"classification": label})
+             for voter, label in [("a", "dili"), ("b", "dili"), ("c", "non_dili")]]
+    assert voting.decide(votes).label == "dili"